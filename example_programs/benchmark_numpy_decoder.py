@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""
+This is a small tool to compare the pure numpy decoder with the
+bufrex routine of the ECMWF BUFR library. Each file given on the
+commandline (or all files in the test_old/testdata directory) is decoded
+with both decoders, the timing is printed and the decoded values
+are compared.
+"""
+
+# Copyright J. de Kloe
+# This software is licensed under the terms of the LGPLv3 Licence
+# which can be obtained from https://www.gnu.org/licenses/lgpl.html
+
+#  #[ imported modules
+from __future__ import print_function
+import os, sys, glob, time
+import numpy
+from pybufr_ecmwf.bufr import BUFRReader
+#  #]
+
+def decode_file(input_bufr_file, decoder):
+    #  #[ decode all messages in a file
+    """
+    decode all messages in the file with the given decoder and
+    return the time used, the number of messages decoded by the
+    numpy decoder, and the decoded values of each message
+    """
+    start = time.time()
+    bufr = BUFRReader(input_bufr_file, warn_about_bufr_size=False,
+                      decoder=decoder)
+    num_numpy = 0
+    all_values = []
+    for msg in bufr:
+        if msg._bufr_obj.decoded_with_numpy:
+            num_numpy += 1
+        try:
+            all_values.append(msg.get_values_as_2d_array())
+        except Exception: # pylint: disable=broad-except
+            # delayed replication may prevent getting a 2D array
+            all_values.append(None)
+    bufr.close()
+    return time.time()-start, num_numpy, all_values
+    #  #]
+
+def compare_decoders(input_bufr_file):
+    #  #[ compare both decoders for one file
+    """ decode the file with both decoders and print the results """
+    try:
+        (t_bufrdc, _, values_bufrdc) = decode_file(input_bufr_file, 'bufrdc')
+        (t_numpy, num_numpy, values_numpy) = decode_file(input_bufr_file,
+                                                         'numpy')
+    except Exception as err: # pylint: disable=broad-except
+        print('%-40s decoding failed: %s' %
+              (os.path.basename(input_bufr_file), str(err)))
+        return
+
+    num_differences = 0
+    for (val1, val2) in zip(values_bufrdc, values_numpy):
+        if val1 is None or val2 is None:
+            continue
+        if ((val1.shape != val2.shape) or
+                not numpy.allclose(val1, val2, rtol=1.e-10)):
+            num_differences += 1
+
+    print('%-40s msgs: %4i numpy: %4i bufrex: %8.4f s numpy: %8.4f s '
+          'differences: %i' %
+          (os.path.basename(input_bufr_file), len(values_bufrdc),
+           num_numpy, t_bufrdc, t_numpy, num_differences))
+    #  #]
+
+#  #[ run the tool
+if len(sys.argv) > 1:
+    INPUT_BUFR_FILES = sys.argv[1:]
+else:
+    INPUT_BUFR_FILES = sorted(glob.glob(os.path.join('test_old', 'testdata',
+                                                     '*')))
+
+for bufr_file in INPUT_BUFR_FILES:
+    compare_decoders(bufr_file)
+#  #]
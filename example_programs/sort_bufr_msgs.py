@@ -74,9 +74,13 @@ def sort_msgs(input_bufr_file):
         can_be_decoded = False
         try:
             bob.get_next_msg()
-            can_be_decoded = True
         except EOFError:
             break
+        try:
+            # the data itself is not needed, but check that the
+            # template can be expanded with the available tables
+            bob.msg.expand_template()
+            can_be_decoded = True
         except KeyError:
             # allow sorting of BUFR messages that cannot be decoded
             # because the needed key is not in the available set of
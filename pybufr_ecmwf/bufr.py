@@ -5,6 +5,7 @@ a module to allow easier handling of BUFR files and messages
 by providing several helper classes. This module defines the
 following classes for general use:
 * BUFRReader: for reading and decoding BUFR messages from a file
+* BUFRStreamReader: for reading and decoding BUFR messages from a stream
 *
 """
 
@@ -36,9 +37,12 @@ from __future__ import (absolute_import, division,
                         print_function)  # , unicode_literals)
 import sys
 import os
+import multiprocessing # allow parallel decoding
 import numpy   # array functionality
-from .raw_bufr_file import RawBUFRFile
-from .bufr_interface_ecmwf import BUFRInterfaceECMWF, EcmwfBufrLibError
+from .raw_bufr_file import RawBUFRFile, RawBUFRStream
+from .bufr_interface_ecmwf import (BUFRInterfaceECMWF, DecodeBufferArena,
+                                   EcmwfBufrLibError, make_tables_link_dir,
+                                   remove_tables_link_dir)
 from .custom_exceptions import \
      (NoMsgLoadedError, CannotExpandFlagsError,
       IncorrectUsageError, NotYetImplementedError)
@@ -79,32 +83,90 @@ class BUFRMessage_R:
                  table_b_to_use, table_c_to_use,
                  table_d_to_use, tables_dir,
                  expand_strings, nr_of_descriptors_startval,
-                 nr_of_descriptors_maxval, nr_of_descriptors_multiplier):
+                 nr_of_descriptors_maxval, nr_of_descriptors_multiplier,
+                 buffer_arena=None, decoder='bufrdc', tables_link_dir=None):
         #  #[ initialise and decode
-        ''' delegate the actual work to BUFRInterfaceECMWF '''
+        '''
+        delegate the actual work to BUFRInterfaceECMWF
+        decoder may be 'bufrdc' (use the bufrex routine) or 'numpy'
+        (use the pure numpy decoder, with bufrex as fallback for
+        messages that it cannot handle)
+        tables_link_dir may be a private directory for the symlinks
+        to the BUFR tables
+        Only sections 0 upto 3 are decoded here. The data section is
+        decoded when the data, names or units are first requested
+        (or when decode() is called).
+        '''
         self._bufr_obj = BUFRInterfaceECMWF(raw_msg,
                                             section_sizes,
                                             section_start_locations,
                                             expand_flags=expand_flags,
-                                            verbose=verbose)
+                                            verbose=verbose,
+                                            buffer_arena=buffer_arena,
+                                            decoder=decoder,
+                                            tables_link_dir=tables_link_dir)
+        self.buffer_arena = buffer_arena
 
         self._bufr_obj.nr_of_descriptors_startval = nr_of_descriptors_startval
         self._bufr_obj.nr_of_descriptors_maxval = nr_of_descriptors_maxval
         self._bufr_obj.nr_of_descriptors_multiplier = (
             nr_of_descriptors_multiplier)
 
-        self._bufr_obj.decode_sections_012()
-        self._bufr_obj.setup_tables(table_b_to_use, table_c_to_use,
-                                    table_d_to_use, tables_dir)
-        self._bufr_obj.decode_data()
-        self._bufr_obj.decode_sections_0123()
-        self._bufr_obj.fill_descriptor_list_subset(subset=1)
+        # store the table choice, which is only needed to decode the data
+        self.tables_to_use = (table_b_to_use, table_c_to_use,
+                              table_d_to_use, tables_dir)
+        self.template_expanded = False
+        self.data_decoded = False
+
+        # decoding the data also fills ksec3 for the old editions
+        # that are not handled by decode_sections_0123_python
+        try:
+            self._bufr_obj.decode_sections_0123_python()
+        except NotYetImplementedError:
+            self._bufr_obj.decode_sections_012()
+        self._bufr_obj.extract_raw_descriptor_list()
         self.msg_index = msg_index
         self.expand_flags = expand_flags
         self.current_subset = None
         self.expand_strings = expand_strings
         #  #]
 
+    def expand_template(self):
+        #  #[ setup the tables and expand the template
+        '''
+        setup the BUFR tables and expand the descriptor list of this
+        message, without decoding the data section
+        '''
+        if self.template_expanded:
+            return
+
+        self._bufr_obj.setup_tables(*self.tables_to_use)
+        self._bufr_obj.template_info = self._bufr_obj.get_template_info()
+        self.template_expanded = True
+        #  #]
+
+    def decode(self):
+        #  #[ decode the data section
+        '''
+        decode the data section of this message, and fill the
+        descriptor lists, names and units for the first subset.
+        This is done automatically when the data, names or units
+        are requested, so calling this is only needed to make sure
+        decoding errors occur at a known point.
+        '''
+        if self.data_decoded:
+            return
+
+        # always setup the tables here, since the symlinks may have
+        # been changed for other messages after expand_template was called
+        self._bufr_obj.setup_tables(*self.tables_to_use)
+        # decode_data also expands the template and fills sections 0 upto 3
+        self._bufr_obj.decode_data()
+        self._bufr_obj.fill_descriptor_list_subset(subset=1)
+        self.template_expanded = True
+        self.data_decoded = True
+        #  #]
+
     def get_num_subsets(self):
         #  #[
         """
@@ -123,6 +185,8 @@ class BUFRMessage_R:
         if (self.msg_index == -1):
             raise NoMsgLoadedError
 
+        self.decode()
+
         return self._bufr_obj.get_num_elements()
         #  #]
 
@@ -134,6 +198,8 @@ class BUFRMessage_R:
         if (self.msg_index == -1):
             raise NoMsgLoadedError
 
+        self.decode()
+
         val = self._bufr_obj.get_value(descr_nr, subset_nr,
                                        autoget_cval=self.expand_strings)
         return val
@@ -148,6 +214,8 @@ class BUFRMessage_R:
         if (self.msg_index == -1):
             raise NoMsgLoadedError
 
+        self.decode()
+
         self._bufr_obj.delayed_repl_check_for_incorrect_use()
 
         vals = self._bufr_obj.get_values(descr_nr,
@@ -165,6 +233,8 @@ class BUFRMessage_R:
         if (self.msg_index == -1):
             raise NoMsgLoadedError
 
+        self.decode()
+
         # needed to have the units ready, so autoget_cval will work
         self._bufr_obj.fill_descriptor_list_subset(subset_nr)
 
@@ -175,30 +245,30 @@ class BUFRMessage_R:
         return vals
         #  #]
 
-    def get_values_as_2d_array(self):
+    def get_values_as_2d_array(self, copy=False):
         #  #[
         """
         a convenience method to allow retrieving all data in
         a bufr message in the form of a 2D array. This first index
         runs over the subsets, the second over the descriptors.
+        If expand_flags is set, the flag and code table columns are
+        converted to text and an array of type object is returned.
+        Otherwise the result is a view on the decoded values, unless
+        copy is True
+        (when the reader reuses its buffers this view is overwritten
+        by decoding the next message).
         """
         if (self.msg_index == -1):
             txt = 'Sorry, no BUFR messages available'
             raise NoMsgLoadedError(txt)
 
+        self.decode()
+
         if self.expand_strings:
             txt = ('Sorry, when expanding strings, the result cannot be ' +
                    'a 2D numerical result')
             raise IncorrectUsageError(txt)
 
-        # if self.expand_flags:
-        #    errtxt = ('ERROR: get_values_as_2d_array only returns numeric '+
-        #              'results and cannot be used together with the '+
-        #              'expand_flags option.'+
-        #              'You will need to extract one element of one row of '+
-        #              'elements at a time in this case.')
-        #    raise CannotExpandFlagsError(errtxt)
-
         self._bufr_obj.delayed_repl_check_for_incorrect_use()
 
         num_subsets = self._bufr_obj.get_num_subsets()
@@ -214,6 +284,11 @@ class BUFRMessage_R:
         factor = int(len(self._bufr_obj.values) / self._bufr_obj.actual_kelem)
         result = self._bufr_obj.values.reshape(
             (factor, self._bufr_obj.actual_kelem))[:num_subsets, :num_elements]
+        if self.expand_flags:
+            # this returns a new array of type object
+            result = self._bufr_obj.convert_flag_columns_to_text(result)
+        elif copy:
+            result = result.copy()
 
         # autoget_cval option not functional yet
         # for data retrieval in a 2D numpy array
@@ -223,6 +298,24 @@ class BUFRMessage_R:
         return result
         #  #]
 
+    def get_strings_as_2d_array(self):
+        #  #[
+        """
+        a convenience method to allow retrieving all strings (CCITTIA5
+        elements) in a bufr message at once. Returns the positions of
+        these elements in the expanded descriptor list, and a 2D array
+        of strings. The first index runs over the subsets, the second
+        over these positions.
+        """
+        if (self.msg_index == -1):
+            txt = 'Sorry, no BUFR messages available'
+            raise NoMsgLoadedError(txt)
+
+        self.decode()
+
+        return self._bufr_obj.get_strings_as_2d_array()
+        #  #]
+
     def get_names_and_units(self, subset=1):
         #  #[ request name and unit of each descriptor for the given subset
         '''
@@ -231,6 +324,8 @@ class BUFRMessage_R:
         if (self.msg_index == -1):
             raise NoMsgLoadedError
 
+        self.decode()
+
         (list_of_names, list_of_units) = (
             self._bufr_obj.get_names_and_units(subset))
 
@@ -245,6 +340,8 @@ class BUFRMessage_R:
         if (self.msg_index == -1):
             raise NoMsgLoadedError
 
+        self.decode()
+
         (list_of_names, list_of_units) = (
             self._bufr_obj.get_names_and_units(subset))
         return list_of_names
@@ -258,6 +355,8 @@ class BUFRMessage_R:
         if (self.msg_index == -1):
             raise NoMsgLoadedError
 
+        self.decode()
+
         (list_of_names, list_of_units) = (
             self._bufr_obj.get_names_and_units(subset))
 
@@ -284,6 +383,8 @@ class BUFRMessage_R:
         if (self.msg_index == -1):
             raise NoMsgLoadedError
 
+        self.expand_template()
+
         list_of_exp_descr = self._bufr_obj.py_expanded_descr_list
         return list_of_exp_descr
         #  #]
@@ -310,22 +411,21 @@ class BUFRMessage_R:
             The units of each variable in the names list. Same length as the
             names list.
         """
+        # note: flags are expanded column wise in the 2D array,
+        # so only delayed replication and expanding strings need
+        # walking over the subsets
         walk_over_subsets = False
-        if self.expand_flags:
+        try:
+            values = self.get_values_as_2d_array()
+            names, units = self.get_names_and_units()
+            # store the results as attributes of self and yield self
+            self.data = values
+            self.names = names
+            self.units = units
+            yield self
+        except IncorrectUsageError:
             walk_over_subsets = True
 
-        if not walk_over_subsets:
-            try:
-                values = self.get_values_as_2d_array()
-                names, units = self.get_names_and_units()
-                # store the results as attributes of self and yield self
-                self.data = values
-                self.names = names
-                self.units = units
-                yield self
-            except IncorrectUsageError:
-                walk_over_subsets = True
-
         if walk_over_subsets:
             # no 2D representation possible. Return 1D arrays instead. If
             # there are multiple subsets yield them one after the other.
@@ -742,10 +842,19 @@ class BUFRReaderBUFRDC:
     """
     def __init__(self, input_bufr_file, warn_about_bufr_size=True,
                  expand_flags=False, expand_strings=False,
-                 verbose=False):
+                 verbose=False, use_mmap=False,
+                 use_index_file=False, index_dir=None, workers=None,
+                 reuse_buffers=False, decoder='bufrdc',
+                 private_tables_dir=False):
         #  #[
         # get an instance of the RawBUFRFile class
-        self._rbf = RawBUFRFile(warn_about_bufr_size=warn_about_bufr_size)
+        # (use_mmap=True avoids reading the whole file into memory,
+        #  use_index_file=True stores the message index in a
+        #  sidecar file to avoid rescanning the file next time)
+        self._rbf = RawBUFRFile(warn_about_bufr_size=warn_about_bufr_size,
+                                use_mmap=use_mmap,
+                                use_index_file=use_index_file,
+                                index_dir=index_dir)
 
         self.verbose = verbose
 
@@ -755,8 +864,29 @@ class BUFRReaderBUFRDC:
         self._rbf.open(input_bufr_file, 'rb')
 
         # extract the number of BUFR messages from the file
-        self.num_msgs = self._rbf.get_num_bufr_msgs()
+        # (in mmap mode without index file this is only known
+        #  after scanning the whole file, see get_num_bufr_msgs)
+        if self._rbf.use_mmap and not self._rbf.scan_completed:
+            self.num_msgs = None
+        else:
+            self.num_msgs = self._rbf.get_num_bufr_msgs()
+
+        self.init_decoding_settings(expand_flags, expand_strings,
+                                    reuse_buffers, decoder,
+                                    private_tables_dir)
 
+        # nr of worker processes used by decoded_messages()
+        self.workers = workers
+        #  #]
+
+    def init_decoding_settings(self, expand_flags, expand_strings,
+                               reuse_buffers=False, decoder='bufrdc',
+                               private_tables_dir=False):
+        #  #[
+        """
+        set the settings used to decode the messages
+        (shared by the file and stream reader classes)
+        """
         # keep track of which bufr message has been loaded and
         # decoded from this file
         self.msg_index = -1
@@ -781,6 +911,46 @@ class BUFRReaderBUFRDC:
         self.nr_of_descriptors_maxval = 500000
         self.nr_of_descriptors_multiplier = 10
 
+        # only sequential decoding by default
+        self.workers = None
+
+        # reuse the decoding arrays for all messages, or allocate
+        # new ones for each message
+        # (the arena may be given sizing hints with its reserve() method)
+        self.buffer_arena = None
+        if reuse_buffers:
+            self.buffer_arena = DecodeBufferArena()
+
+        # choose between the bufrex decoder and the numpy decoder
+        self.decoder = decoder
+
+        # use a directory for the symlinks to the BUFR tables that
+        # is not shared with other readers and processes, or the
+        # default one
+        self.tables_link_dir = None
+        if private_tables_dir:
+            self.tables_link_dir = make_tables_link_dir('tmp_BUFR_TABLES_')
+        #  #]
+
+    def get_decoding_settings(self):
+        #  #[
+        """
+        collect the settings needed to decode a message in a dict
+        of keyword arguments for the BUFRMessage_R class
+        """
+        return {'expand_flags':self.expand_flags,
+                'verbose':self.verbose,
+                'table_b_to_use':self.table_b_to_use,
+                'table_c_to_use':self.table_c_to_use,
+                'table_d_to_use':self.table_d_to_use,
+                'tables_dir':self.tables_dir,
+                'expand_strings':self.expand_strings,
+                'nr_of_descriptors_startval':self.nr_of_descriptors_startval,
+                'nr_of_descriptors_maxval':self.nr_of_descriptors_maxval,
+                'nr_of_descriptors_multiplier':
+                self.nr_of_descriptors_multiplier,
+                'decoder':self.decoder,
+                'tables_link_dir':self.tables_link_dir}
         #  #]
 
     def setup_tables(self, table_b_to_use=None, table_c_to_use=None,
@@ -816,6 +986,19 @@ class BUFRReaderBUFRDC:
             self.nr_of_descriptors_multiplier = nr_of_descriptors_multiplier
         #  #]
 
+    def get_num_bufr_msgs(self):
+        #  #[ request the number of messages
+        """
+        request the number of BUFR messages in the open file.
+        Note that in mmap mode without index file this requires
+        scanning the whole file (so the cost is O(file size)),
+        which is not needed for iterating over the messages.
+        """
+        if self.num_msgs is None:
+            self.num_msgs = self._rbf.get_num_bufr_msgs()
+        return self.num_msgs
+        #  #]
+
     def get_next_msg(self):
         #  #[ step to next msg
         """
@@ -824,16 +1007,11 @@ class BUFRReaderBUFRDC:
         (raw_msg, section_sizes, section_start_locations) = (
             self._rbf.get_next_raw_bufr_msg())
         msg_index = self._rbf.last_used_msg
-        self.msg = BUFRMessage_R(
-            raw_msg,
-            section_sizes, section_start_locations,
-            self.expand_flags, msg_index, self.verbose,
-            self.table_b_to_use, self.table_c_to_use,
-            self.table_d_to_use, self.tables_dir,
-            self.expand_strings,
-            nr_of_descriptors_startval=self.nr_of_descriptors_startval,
-            nr_of_descriptors_maxval=self.nr_of_descriptors_maxval,
-            nr_of_descriptors_multiplier=self.nr_of_descriptors_multiplier)
+        self.msg = BUFRMessage_R(raw_msg,
+                                 section_sizes, section_start_locations,
+                                 msg_index=msg_index,
+                                 buffer_arena=self.buffer_arena,
+                                 **self.get_decoding_settings())
 
         # if msg_index>2995:
         #    print('writing debug file.')
@@ -859,17 +1037,75 @@ class BUFRReaderBUFRDC:
             or for the current subset of the current bufr message
             in which case it will be a 1D array.
         """
+        # step through the file until the last message is reached,
+        # so the number of messages is not needed in advance
         allow_skip_invalid_messages = False
-        for i in numpy.arange(self.num_msgs) + 1:
-            if allow_skip_invalid_messages:
-                try:
-                    self.get_next_msg()
-                    yield self.msg
-                except EcmwfBufrLibError:
-                    pass
-            else:
+        while True:
+            try:
                 self.get_next_msg()
-                yield self.msg
+            except EOFError:
+                # the whole file has been scanned now
+                self.num_msgs = self._rbf.get_num_bufr_msgs()
+                return
+            except EcmwfBufrLibError:
+                if allow_skip_invalid_messages:
+                    continue
+                raise
+            yield self.msg
+        #  #]
+
+    def decoded_messages(self, ordered=True, chunksize=1):
+        #  #[ iterate over decoded data, possibly in parallel
+        """
+        Iterate over the decoded data of all BUFR messages. If the
+        workers setting of this reader is larger than 1, the messages
+        are distributed over this number of worker processes, each with
+        its own instance of the decoding library and BUFR tables.
+        (the ECMWF library uses global variables, so threads cannot
+        be used for this).
+
+        Parameters
+        ----------
+        ordered:
+            if True the results are returned in the order of the
+            messages in the file, otherwise in the order in which
+            they are finished.
+        chunksize:
+            the nr of messages sent to a worker process in one go.
+
+        Yields
+        ------
+        (msg_index, decoded_data):
+            the message number (starting at 1) and a list of
+            (data, names, units) tuples, as yielded by
+            BUFRMessage_R.data_iterator() for this message.
+        """
+        if (self.workers is None) or (self.workers < 2):
+            for msg in self.messages():
+                yield (msg.msg_index, collect_decoded_data(msg))
+            return
+
+        # give each worker its own directory for the symlinks to
+        # the BUFR tables, to prevent them from changing each others links
+        pool_tables_dir = make_tables_link_dir('tmp_BUFR_TABLES_pool_')
+        initargs = (self._rbf.filename, self._rbf.get_index(),
+                    self.get_decoding_settings(), pool_tables_dir)
+        pool = multiprocessing.Pool(self.workers,
+                                    initializer=init_decoding_worker,
+                                    initargs=initargs)
+        try:
+            if ordered:
+                map_function = pool.imap
+            else:
+                map_function = pool.imap_unordered
+            for result in map_function(decode_msg_in_worker,
+                                       range(1, self.get_num_bufr_msgs()+1),
+                                       chunksize):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+            remove_tables_link_dir(pool_tables_dir)
         #  #]
 
     def __iter__(self):
@@ -893,6 +1129,124 @@ class BUFRReaderBUFRDC:
         close the file object
         """
         self._rbf.close()
+        if self.tables_link_dir is not None:
+            remove_tables_link_dir(self.tables_link_dir)
+            self.tables_link_dir = None
+        #  #]
+    #  #]
+
+
+#  #[ helper functions for parallel decoding
+# the reading state of a worker process used by
+# BUFRReaderBUFRDC.decoded_messages()
+WORKER_STATE = {}
+
+def init_decoding_worker(input_bufr_file, index, decoding_settings,
+                         pool_tables_dir):
+    #  #[ initialise a worker process
+    '''
+    open the BUFR file in a worker process, using the message index
+    of the parent process to prevent scanning the file again.
+    The symlinks to the BUFR tables are made in a directory for this
+    worker below pool_tables_dir (which is removed by the parent process)
+    '''
+    rbf = RawBUFRFile(use_mmap=True)
+    rbf.open(input_bufr_file, 'rb')
+    rbf.set_index(index)
+    WORKER_STATE['rbf'] = rbf
+    decoding_settings = dict(decoding_settings)
+    decoding_settings['tables_link_dir'] = os.path.join(
+        pool_tables_dir, 'worker_'+str(os.getpid()))
+    WORKER_STATE['decoding_settings'] = decoding_settings
+    #  #]
+
+def decode_msg_in_worker(msg_nr):
+    #  #[ decode a message in a worker process
+    '''
+    decode the given message in a worker process and return
+    the result in a form that can be sent back to the parent process
+    '''
+    (raw_msg, section_sizes, section_start_locations) = (
+        WORKER_STATE['rbf'].get_raw_bufr_msg(msg_nr))
+    msg = BUFRMessage_R(raw_msg, section_sizes, section_start_locations,
+                        msg_index=msg_nr,
+                        **WORKER_STATE['decoding_settings'])
+    return (msg_nr, collect_decoded_data(msg))
+    #  #]
+
+def collect_decoded_data(msg):
+    #  #[ get all decoded data from a message
+    '''
+    return a list of (data, names, units) tuples for all
+    items yielded by the data_iterator of the given message
+    '''
+    if msg.buffer_arena is None:
+        return [(item.data, item.names, item.units) for item in msg]
+    # the data is overwritten by the next message in this case
+    return [(numpy.array(item.data), item.names, item.units) for item in msg]
+    #  #]
+#  #]
+
+
+class BUFRStreamReaderBUFRDC(BUFRReaderBUFRDC):
+    #  #[ bufrdc stream reader class
+    """
+    a class that combines reading and decoding of BUFR messages
+    arriving on a binary stream that does not allow seeking,
+    like stdin, a pipe or a socket (see the RawBUFRStream class).
+    Only iteration over the messages is possible, and the
+    number of messages is not known in advance.
+    """
+    def __init__(self, stream, chunk_size=65536, warn_about_bufr_size=True,
+                 expand_flags=False, expand_strings=False,
+                 verbose=False, reuse_buffers=False, decoder='bufrdc',
+                 private_tables_dir=False):
+        #  #[
+        # get an instance of the RawBUFRStream class
+        self._rbf = RawBUFRStream(stream, chunk_size=chunk_size,
+                                  warn_about_bufr_size=warn_about_bufr_size)
+
+        self.verbose = verbose
+
+        # the number of messages is unknown for a stream
+        self.num_msgs = None
+
+        self.init_decoding_settings(expand_flags, expand_strings,
+                                    reuse_buffers, decoder,
+                                    private_tables_dir)
+        #  #]
+
+    def raw_messages(self):
+        #  #[ iterate over the raw messages
+        """
+        Iterate over the raw BUFR messages in the stream without
+        decoding them.
+
+        Yields
+        ------
+        (words, section_sizes, section_start_locations):
+            the raw message as returned by RawBUFRStream
+        """
+        return self._rbf.raw_messages()
+        #  #]
+
+    def messages(self):
+        #  #[ iterate over messages for reading
+        """
+        Iterate over the BUFR messages in the stream, until the end
+        of the stream is reached.
+
+        Yields
+        ------
+        msg:
+            An instance of BUFRMessage_R for the current message
+        """
+        while True:
+            try:
+                self.get_next_msg()
+            except EOFError:
+                return
+            yield self.msg
         #  #]
     #  #]
 
@@ -904,8 +1258,13 @@ class BUFRWriterBUFRDC:
     and to create BUFR files
     It implements a file like interface for user convenience.
     """
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, write_buffer_size=-1,
+                 flush_every=None, trim_padding=False):
         self.verbose = verbose
+        # output settings passed on to the RawBUFRFile instance
+        self.write_buffer_size = write_buffer_size
+        self.flush_every = flush_every
+        self.trim_padding = trim_padding
 
     def add_new_msg(self, num_subsets=1):
         #  #[ initialise a new bufr message
@@ -917,7 +1276,9 @@ class BUFRWriterBUFRDC:
     def open(self, filename):
         #  #[ open a new bufr file for writing
         # get an instance of the RawBUFRFile class
-        self.raw_bf = RawBUFRFile()
+        self.raw_bf = RawBUFRFile(write_buffer_size=self.write_buffer_size,
+                                  flush_every=self.flush_every,
+                                  trim_padding=self.trim_padding)
 
         # open the file for writing
         self.raw_bf.open(filename, 'wb')
@@ -1573,6 +1934,7 @@ if 'PYBUFR_ECMWF_USE_ECCODES' in env:
         use_eccodes = True
 
 BUFRReader = BUFRReaderBUFRDC
+BUFRStreamReader = BUFRStreamReaderBUFRDC
 BUFRWriter = BUFRWriterBUFRDC
 
 if use_eccodes:
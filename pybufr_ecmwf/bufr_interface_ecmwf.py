@@ -36,12 +36,16 @@ to make it a bit easier in dayly use.
 from __future__ import (absolute_import, division,
                         print_function, with_statement) #, unicode_literals)
 import os          # operating system functions
+import errno       # error codes of os functions
+import glob        # finding files
+import atexit      # cleanup at exit
+import shutil      # removing directories
 import sys         # system functions
 import time        # handling of date and time
 import numpy as np # import numerical capabilities
-import struct      # allow converting c datatypes and structs
 import tempfile    # handling temporary files
 import uuid        # get unique id strings
+from collections import OrderedDict # least recently used caches
 
 # import the raw wrapper interface to the ECMWF BUFR library
 try:
@@ -60,11 +64,158 @@ from .bufr_table import (BufrTable,
                          Delayed_Descr_and_Data_Rep_Factor,
                          Ext_Delayed_Descr_and_Data_Rep_Factor)
 from .custom_exceptions import (EcmwfBufrLibError, EcmwfBufrTableError,
-                                IncorrectUsageError)
+                                IncorrectUsageError, NotYetImplementedError)
+from .numpy_decoder import NumpyBUFRDecoder
 #  #]
 
 MISSING_INDICATOR = 1.7e38
 
+# location for storing temporary files, include the uid
+# in the name to make sure the path is unique for each user
+TEMP_DIR = '/tmp/pybufr_ecmwf_temporary_files_'+str(os.getuid())
+
+def remove_dir_if_present(dirname):
+    #  #[ remove a directory tree
+    '''
+    remove the given directory and its content if it exists
+    '''
+    shutil.rmtree(dirname, ignore_errors=True)
+    #  #]
+
+def make_tables_link_dir(prefix):
+    #  #[ create a new directory for symlinks to BUFR tables
+    '''
+    create a new, uniquely named, directory in the temporary files
+    directory, that may be used as tables_link_dir by BUFRInterfaceECMWF.
+    It is removed at exit, if the caller did not remove it before.
+    '''
+    if not os.path.exists(TEMP_DIR):
+        os.makedirs(TEMP_DIR)
+    tables_link_dir = tempfile.mkdtemp(prefix=prefix, dir=TEMP_DIR)
+    atexit.register(remove_tables_link_dir, tables_link_dir)
+    return tables_link_dir
+    #  #]
+
+def remove_tables_link_dir(dirname):
+    #  #[ remove a directory with symlinks to BUFR tables
+    '''
+    remove a private directory with symlinks to BUFR tables, and
+    forget the table setups and symlinks made in it (or in the
+    directories below it, like the worker dirs of a pool) so these
+    class level caches of BUFRInterfaceECMWF do not keep growing.
+    '''
+    remove_dir_if_present(dirname)
+
+    def is_inside(path):
+        """ check if path is dirname or below it """
+        return (path == dirname) or path.startswith(dirname+os.path.sep)
+
+    table_setup_cache = BUFRInterfaceECMWF.table_setup_cache
+    for key in list(table_setup_cache):
+        # the last item of the key is the tables dir
+        if is_inside(key[-1]):
+            del table_setup_cache[key]
+    current_table_links = BUFRInterfaceECMWF.current_table_links
+    for link in list(current_table_links):
+        if is_inside(os.path.dirname(link)):
+            del current_table_links[link]
+    #  #]
+
+def remove_stale_process_tables_dirs(temp_dir):
+    #  #[ remove the tables dirs of processes that have ended
+    '''
+    remove the per process tables dirs (tables_dir_mode 'process')
+    of processes that are no longer running. Child processes that
+    end with os._exit(), like the workers of multiprocessing, do not
+    run their atexit functions, so their parent removes these dirs.
+    '''
+    prefix = os.path.join(temp_dir, 'tmp_BUFR_TABLES_pid_')
+    for dirname in glob.glob(prefix+'*'):
+        pid = dirname[len(prefix):]
+        if (not pid.isdigit()) or (int(pid) == os.getpid()):
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except OSError as err:
+            if err.errno == errno.ESRCH:
+                # no process with this pid
+                remove_tables_link_dir(dirname)
+    #  #]
+
+def remove_file_if_present(filename):
+    #  #[ remove a file, if it still exists
+    """
+    remove a file, if it still exists (used to clean up
+    the fortran stdout files at exit)
+    """
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+    #  #]
+
+class DecodeBufferArena:
+    #  #[
+    """
+    a set of buffers that can be reused to decode a series of
+    BUFR messages. Each buffer only grows, and a zeroed view of the
+    requested size is handed out, so after the first few messages
+    no new memory needs to be allocated anymore.
+    Note that the data in these views is overwritten when the
+    next message is decoded using the same arena.
+    """
+    def __init__(self, **sizing_hints):
+        #  #[
+        """
+        sizing_hints may give the initial number of elements
+        to allocate for each buffer name (i.e. values=100000)
+        """
+        self.buffers = {}
+        self.sizing_hints = {}
+        self.reserve(**sizing_hints)
+        #  #]
+    def reserve(self, **sizing_hints):
+        #  #[
+        """
+        set the minimum number of elements to allocate for the named
+        buffers the next time they are (re)allocated
+        """
+        for (name, num_elements) in sizing_hints.items():
+            self.sizing_hints[name] = max(num_elements,
+                                          self.sizing_hints.get(name, 0))
+        #  #]
+    def get_buffer(self, name, shape, dtype, zeroed=True):
+        #  #[
+        """
+        returns a zero filled, contiguous array of the given shape
+        and dtype, which is a view on the buffer with the given name
+        (if zeroed is False a reused buffer is not cleared, which is
+        only safe if the caller overwrites the part it reads)
+        """
+        dtype = np.dtype(dtype)
+        num_elements = int(np.prod(shape))
+        buf = self.buffers.get(name)
+        if (buf is None) or (buf.dtype != dtype) or (buf.size < num_elements):
+            size = max(num_elements, self.sizing_hints.get(name, 0))
+            if (buf is not None) and (buf.dtype == dtype):
+                # grow by at least 50% to limit the number of reallocations
+                size = max(size, (3*buf.size)//2)
+            buf = np.zeros(size, dtype=dtype)
+            self.buffers[name] = buf
+            view = buf[:num_elements]
+        else:
+            view = buf[:num_elements]
+            if zeroed:
+                view[...] = 0
+        return view.reshape(shape)
+        #  #]
+    def get_size_bytes(self):
+        #  #[
+        """ returns the total memory used by the buffers """
+        return sum(buf.nbytes for buf in self.buffers.values())
+        #  #]
+    #  #]
+
 class BUFRInterfaceECMWF:
     #  #[
     """
@@ -83,15 +234,64 @@ class BUFRInterfaceECMWF:
     size_ksec4 = ecmwfbufr_parameters.JSEC4
 
     bufr_tables_env_setting_set_by_script = False
-    
+
+    # the tables chosen by setup_tables, keyed by the section 1
+    # parameters that determine the table names and the user choices,
+    # so the table files only need to be searched once
+    table_setup_cache = {}
+    # the targets of the symlinks made by this process in the private
+    # tables dirs (in the shared one other processes may change them)
+    current_table_links = {}
+
+    # where to create the symlinks to the BUFR tables:
+    # 'shared': in one directory for all processes of a user
+    # 'process': in a directory for each process, removed at exit
+    #            (safe when many processes decode at the same time)
+    tables_dir_mode = 'shared'
+    process_tables_dirs = set()
+
+    # cache of the information derived from the expanded template,
+    # shared between all instances, to prevent expanding the same
+    # template again for each message. The key is a tuple of the
+    # table set and the unexpanded descriptor list.
+    # If it is full the least recently used template is removed.
+    template_cache = OrderedDict()
+    max_template_cache_size = 100
+
+    # how to capture the fortran stdout:
+    # 'reuse': use one output file per process, which is truncated
+    #          by the fortran open call and kept between calls
+    # 'tempfile': create and remove a new temporary file for each call
+    # 'on_error': send it to /dev/null, which is kept open between
+    #             calls, and only if a library call fails run it
+    #             again with the output captured in the 'reuse' file
+    #             (output of successful calls, like warnings, is lost)
+    fortran_stdout_mode = 'reuse'
+    reused_fortran_stdout_files = set()
+    # the PID of the process in which the fortran stdout unit is
+    # currently connected to /dev/null (None if it is not)
+    fortran_stdout_devnull_pid = None
+
+    # NumpyBUFRDecoder instances, one for each set of BUFR tables
+    numpy_decoders = {}
+
     #  #]
     def __init__(self, encoded_message=None, section_sizes=None,
                  section_start_locations=None, verbose=False,
-                 expand_flags=False):
+                 expand_flags=False, buffer_arena=None, decoder='bufrdc',
+                 tables_link_dir=None):
         #  #[
         """
         initialise all module parameters needed for encoding and decoding
         BUFR messages
+        buffer_arena may be a DecodeBufferArena instance to allocate the
+        decoding arrays from
+        decoder may be 'bufrdc' (always use the bufrex routine) or 'numpy'
+        (let decode_data use the numpy decoder for all templates it
+        supports, and bufrex for the others)
+        tables_link_dir may be a directory to create the symlinks to
+        the BUFR tables in, in stead of the one chosen by tables_dir_mode
+        (the caller is responsible for removing it)
         """
         # this array will hold the binary message before decoding from
         # or after encoding to the raw BUFR format
@@ -111,11 +311,17 @@ class BUFRInterfaceECMWF:
         # so I added custom code for this,
         self.expand_flags = expand_flags
 
+        self.decoder = decoder
+
         # switches
         self.sections012_decoded      = False
         self.sections0123_decoded     = False
         self.data_decoded             = False
+        self.decoded_with_numpy       = False
         self.descriptors_list_filled  = False
+        # the subset for which the descriptor lists were filled
+        # (None if they are valid for all subsets)
+        self.descriptors_list_subset  = None
         self.bufr_template_registered = False # for encoding only
         self.data_encoded             = False # for encoding only
         
@@ -192,11 +398,12 @@ class BUFRInterfaceECMWF:
         # has been retrieved (so just before entering the bufrex routine)
         self.values = None
         self.cvals  = None
+
+        # if defined, the decoding arrays are taken from this arena
+        self.buffer_arena = buffer_arena
         
-        # location for storing temporary files, include the uid
-        # in the name to make sure the path is unique for each user
-        self.temp_dir = ('/tmp/pybufr_ecmwf_temporary_files_'+
-                         str(os.getuid()))
+        # location for storing temporary files
+        self.temp_dir = TEMP_DIR
 
         # ensure the directory needed to store temporary files is present
         if not os.path.exists(self.temp_dir):
@@ -205,15 +412,39 @@ class BUFRInterfaceECMWF:
         # path in which symlinks will be created to the BUFR tables we need
         # (note that it must be an absolute path! this is required by the
         #  ecmwf library)
-        self.private_bufr_tables_dir = \
-             os.path.abspath(os.path.join(self.temp_dir,
-                                          'tmp_BUFR_TABLES'))
-    
+        # only this process changes the symlinks in a private dir
+        self.tables_dir_is_private = True
+        if tables_link_dir is not None:
+            self.private_bufr_tables_dir = os.path.abspath(tables_link_dir)
+        elif self.tables_dir_mode == 'process':
+            # other processes cannot change the symlinks in this one
+            self.private_bufr_tables_dir = \
+                 os.path.abspath(os.path.join(self.temp_dir,
+                                              'tmp_BUFR_TABLES_pid_'+
+                                              str(os.getpid())))
+            if (self.private_bufr_tables_dir not in
+                    self.__class__.process_tables_dirs):
+                self.__class__.process_tables_dirs.add(
+                    self.private_bufr_tables_dir)
+                remove_stale_process_tables_dirs(self.temp_dir)
+                atexit.register(remove_stale_process_tables_dirs,
+                                self.temp_dir)
+                atexit.register(remove_tables_link_dir,
+                                self.private_bufr_tables_dir)
+        else:
+            self.private_bufr_tables_dir = \
+                 os.path.abspath(os.path.join(self.temp_dir,
+                                              'tmp_BUFR_TABLES'))
+            self.tables_dir_is_private = False
 
         # ensure the directory exsists in which we will create
         # symbolic links to the bufr tables to be used
         if (not os.path.exists(self.private_bufr_tables_dir)):
-            os.mkdir(self.private_bufr_tables_dir)
+            os.makedirs(self.private_bufr_tables_dir)
+            # forget links made in a previous directory with this name
+            for link in list(self.current_table_links):
+                if os.path.dirname(link) == self.private_bufr_tables_dir:
+                    del self.current_table_links[link]
 
         # store the user supplied environment setting for BUFR_TABLES
         # to allow later use by the setup_tables method
@@ -235,15 +466,24 @@ class BUFRInterfaceECMWF:
         self.table_b_file_to_use = None
         self.table_d_file_to_use = None
         self.ecmwf_bufr_tables_dir = None
+        # identifies the actual table files, used by the template cache
+        self.table_set_key = None
         
         # lists used by the python extraction of the descriptors
         self.py_num_subsets = 0
         self.py_unexp_descr_list = None
+        self.py_unexp_descr_array = None
+        self.py_compressed = False
+        self.py_section3_flags = 0
         self.py_expanded_descr_list = None
         self.delayed_repl_present = False
         self.delayed_repl_problem_reported = False
+
+        # the template_cache entry for the current message
+        self.template_info = None
         
         self.outp_file = None
+        self.fortran_stdout_discarded = False
 
         # to store the loaded BUFR table information
         self.bt = None
@@ -426,7 +666,7 @@ class BUFRInterfaceECMWF:
         
         return (name_table_b, name_table_c, name_table_d)
         #  #]
-    def store_fortran_stdout(self):
+    def store_fortran_stdout(self, capture=False):
         #  #[
         """
         Set the 'STD_OUT' environment variable to redirect the
@@ -436,16 +676,44 @@ class BUFRInterfaceECMWF:
         output get written to 2 different output buffers, and will
         be mixed in inpredictable ways (which makes it impossible
         to interpret the output or to define unit test cases ...)
+        In 'on_error' mode the output is discarded, unless capture
+        is set (used for the print routines and to run a failed
+        call again).
         """
-        if 'STD_OUT' in os.environ:
-            outp_fileunit = os.environ['STD_OUT']
-        else:
-            outp_fileunit = '12'
-            os.environ['STD_OUT'] = outp_fileunit
+        if 'STD_OUT' not in os.environ:
+            os.environ['STD_OUT'] = '12'
 
         # suppres the default ECMWF welcome message which
         # is not yet redirected to the above defined fileunit
-        os.environ['PRINT_TABLE_NAMES'] = 'FALSE'
+        if os.environ.get('PRINT_TABLE_NAMES') != 'FALSE':
+            os.environ['PRINT_TABLE_NAMES'] = 'FALSE'
+
+        self.fortran_stdout_discarded = False
+        if self.fortran_stdout_mode == 'on_error' and not capture:
+            self.fortran_stdout_discarded = True
+            # only open /dev/null once, get_fortran_stdout does not
+            # close it, so the next calls can write to it directly
+            if self.__class__.fortran_stdout_devnull_pid != os.getpid():
+                ecmwfbufr.open_fortran_stdout(os.devnull)
+                self.__class__.fortran_stdout_devnull_pid = os.getpid()
+            return
+
+        # opening an other file closes the /dev/null connection
+        self.__class__.fortran_stdout_devnull_pid = None
+
+        if self.fortran_stdout_mode in ('on_error', 'reuse'):
+            # the fortran open call uses STATUS="REPLACE" so the
+            # output of a previous call is discarded. The PID is
+            # included in the name to give each (worker) process
+            # its own file.
+            self.outp_file = os.path.join(self.temp_dir,
+                                          'fortran_stdout_'+
+                                          str(os.getpid())+'.txt')
+            if self.outp_file not in self.__class__.reused_fortran_stdout_files:
+                self.__class__.reused_fortran_stdout_files.add(self.outp_file)
+                atexit.register(remove_file_if_present, self.outp_file)
+            ecmwfbufr.open_fortran_stdout(self.outp_file)
+            return
 
         # Determine filename to use to redirect the fortran stdout stream
         # Note that we cannot directly use the file object returned
@@ -480,9 +748,29 @@ class BUFRInterfaceECMWF:
         file by the store_fortran_stdout method
         """
 
+        if self.fortran_stdout_discarded:
+            # nothing was captured, and /dev/null is kept open
+            return []
+
         # close the fortran stdout() channel. This should flush all
         # output may still be buffered at this point
         ecmwfbufr.close_fortran_stdout()
+
+        if self.fortran_stdout_mode in ('on_error', 'reuse'):
+            # keep the file for the next call, and only read it
+            # if the fortran code actually wrote something
+            try:
+                if os.path.getsize(self.outp_file) == 0:
+                    return []
+            except OSError:
+                return []
+            with open(self.outp_file, 'r+') as ffd:
+                lines = ffd.readlines()
+                # empty it, so a next call to this method
+                # without a new fortran call returns nothing
+                ffd.seek(0)
+                ffd.truncate()
+            return lines
         
         # now read the temporary file and display the output
         if os.path.exists(self.outp_file):
@@ -497,6 +785,25 @@ class BUFRInterfaceECMWF:
 
         return lines
         #  #]        
+    def rerun_with_fortran_stdout(self, routine, args):
+        #  #[
+        """
+        run a library routine that failed again, now capturing
+        the fortran stdout, if that was discarded in 'on_error' mode
+        during the first call. Returns the captured lines (an empty
+        list if the output of the first call was already captured).
+        """
+        if not self.fortran_stdout_discarded:
+            return []
+
+        self.store_fortran_stdout(capture=True)
+        try:
+            routine(*args)
+        except Exception:
+            # the error of the first call is reported by the caller
+            pass
+        return self.get_fortran_stdout()
+        #  #]
     def display_fortran_stdout(self,lines):
         #  #[
         """
@@ -519,16 +826,19 @@ class BUFRInterfaceECMWF:
 
         if self.verbose:
             print("calling: ecmwfbufr.bus012():")
+        args = (self.encoded_message, # input
+                self.ksup,  # output
+                self.ksec0, # output
+                self.ksec1, # output
+                self.ksec2, # output
+                kerr)       # output
         self.store_fortran_stdout()
-        ecmwfbufr.bus012(self.encoded_message, # input
-                         self.ksup,  # output
-                         self.ksec0, # output
-                         self.ksec1, # output
-                         self.ksec2, # output
-                         kerr)       # output
+        ecmwfbufr.bus012(*args)
         lines = self.get_fortran_stdout()
         self.display_fortran_stdout(lines)
         if (kerr != 0):
+            lines = self.rerun_with_fortran_stdout(ecmwfbufr.bus012, args)
+            self.display_fortran_stdout(lines)
             raise EcmwfBufrLibError(self.explain_error(kerr, 'bus012'))
 
         self.sections012_decoded = True
@@ -555,19 +865,108 @@ class BUFRInterfaceECMWF:
        
         if self.verbose:
             print("calling: ecmwfbufr.bus012():")
+        args = (self.encoded_message, # input
+                self.ksup,  # output
+                self.ksec0, # output
+                self.ksec1, # output
+                self.ksec2, # output
+                self.ksec3, # output
+                kerr)       # output
         self.store_fortran_stdout()
-        ecmwfbufr.bus0123(self.encoded_message, # input
-                          self.ksup,  # output
-                          self.ksec0, # output
-                          self.ksec1, # output
-                          self.ksec2, # output
-                          self.ksec3, # output
-                          kerr)       # output
+        ecmwfbufr.bus0123(*args)
         lines = self.get_fortran_stdout()
         self.display_fortran_stdout(lines)
         if (kerr != 0):
+            lines = self.rerun_with_fortran_stdout(ecmwfbufr.bus0123, args)
+            self.display_fortran_stdout(lines)
             raise EcmwfBufrLibError(self.explain_error(kerr, 'bus0123'))
 
+        self.sections012_decoded  = True
+        self.sections0123_decoded = True
+        #  #]
+    def decode_sections_0123_python(self):
+        #  #[ python replacement for bus0123
+        """
+        decode sections 0, 1, 2 and 3 directly from the message bytes,
+        without calling the ECMWF library. This fills the same ksec0,
+        ksec1 and ksec3 items as bus0123, but for section 2 only the
+        length is filled (the ECMWF local key is filled when the data
+        is decoded with bufrex).
+        Raises NotYetImplementedError for editions before 3, which have
+        a different section 0 or 1 layout, in which case the
+        decode_sections_012 or decode_sections_0123 method should be used.
+        """
+        raw_data_bytes = np.asarray(self.encoded_message).\
+                         astype('<i4', copy=False).view('u1')
+
+        def get_int(start, num_bytes):
+            ''' convert big endian bytes to an integer '''
+            value = 0
+            for byte in raw_data_bytes[start:start+num_bytes].tolist():
+                value = 256*value + byte
+            return value
+
+        edition = int(raw_data_bytes[7])
+        if edition < 3:
+            raise NotYetImplementedError('decoding the header of BUFR '+
+                                         'edition %i in python' % edition)
+
+        # section 0
+        msg_length = get_int(4, 3)
+        self.ksec0[:3] = [8, msg_length, edition]
+
+        # section 1 (see also fill_sections_0123 for the meaning
+        # of the ksec1 items)
+        start = self.section_start_locations[1]
+        self.ksec1[:] = 0
+        self.ksec1[1-1] = get_int(start, 3)
+        self.ksec1[2-1] = edition
+        self.ksec1[14-1] = get_int(start+3, 1)
+        if edition == 3:
+            self.ksec1[3-1] = get_int(start+5, 1)
+            self.ksec1[16-1] = get_int(start+4, 1)
+            self.ksec1[4-1] = get_int(start+6, 1)
+            self.ksec1[5-1] = get_int(start+7, 1)
+            self.ksec1[6-1] = get_int(start+8, 1)
+            self.ksec1[7-1] = get_int(start+9, 1)
+            self.ksec1[15-1] = get_int(start+10, 1)
+            self.ksec1[8-1] = get_int(start+11, 1)
+            self.ksec1[9-1:13] = raw_data_bytes[start+12:start+17]
+            local_start = start+17
+        else:
+            self.ksec1[3-1] = get_int(start+4, 2)
+            self.ksec1[16-1] = get_int(start+6, 2)
+            self.ksec1[4-1] = get_int(start+8, 1)
+            self.ksec1[5-1] = get_int(start+9, 1)
+            self.ksec1[6-1] = get_int(start+10, 1)
+            self.ksec1[17-1] = get_int(start+11, 1)
+            self.ksec1[7-1] = get_int(start+12, 1)
+            self.ksec1[15-1] = get_int(start+13, 1)
+            self.ksec1[8-1] = get_int(start+14, 1)
+            self.ksec1[9-1] = get_int(start+15, 2)
+            self.ksec1[10-1:13] = raw_data_bytes[start+17:start+21]
+            self.ksec1[18-1] = get_int(start+21, 1)
+            local_start = start+22
+
+        # items 19 and above hold the local ADP centre information
+        local_bytes = raw_data_bytes[local_start:start+self.ksec1[0]]
+        local_bytes = local_bytes[:len(self.ksec1)-18]
+        self.ksec1[18:18+len(local_bytes)] = local_bytes
+
+        # section 2
+        self.ksec2[:] = 0
+        self.ksec2[0] = self.section_sizes[2]
+
+        # section 3
+        start = self.section_start_locations[3]
+        num_subsets = get_int(start+4, 2)
+        self.ksec3[:4] = [self.section_sizes[3], 0, num_subsets,
+                          get_int(start+6, 1)]
+
+        # the ksup items that are used by this module
+        self.ksup[5] = num_subsets
+        self.ksup[7] = msg_length
+
         self.sections012_decoded  = True
         self.sections0123_decoded = True
         #  #]
@@ -675,6 +1074,104 @@ class BUFRInterfaceECMWF:
             print("is not yet implemented.")
             sys.exit(1)
 
+        key = (center, subcenter, LocalVersion, MasterTableVersion,
+               EditionNumber, MasterTableNumber,
+               table_b_to_use, table_c_to_use, table_d_to_use,
+               tables_dir, self.user_tables_dir,
+               self.private_bufr_tables_dir)
+        table_setup = self.table_setup_cache.get(key)
+        if table_setup is None:
+            table_setup = self.find_tables(center, subcenter,
+                                           LocalVersion, MasterTableVersion,
+                                           EditionNumber, MasterTableNumber,
+                                           table_b_to_use, table_c_to_use,
+                                           table_d_to_use, tables_dir)
+            self.table_setup_cache[key] = table_setup
+
+        (destination_b, destination_c, destination_d,
+         source_b, source_c, source_d) = table_setup['files']
+
+        # c-tables are not used by the ecmwf bufrdc library,
+        # so this warning is not very useful
+        #if not source_c:
+        #    print('Warning: no matching C table available for B,D tables')
+        #    print('==>', os.path.split(source_b)[1])
+        #    print('==>', os.path.split(source_d)[1])
+            
+        # full names, containing full path, are not nice to print
+        # in the unit tests since they will differ on different
+        # machines, so print the bare filename only
+        if self.verbose:
+            print('Table names expected by the library:')
+            print(os.path.split(destination_b)[1])
+            print(os.path.split(destination_c)[1])
+            print(os.path.split(destination_d)[1])
+            print('Tables to be used:')
+            print(os.path.split(source_b)[1])
+            if source_c:
+                print(os.path.split(source_c)[1])
+            else:
+                print('[C table is missing]')
+            print(os.path.split(source_d)[1])
+
+        # point the symbolic links to the tables to use
+        # (this only touches the links if their target changes)
+        self.link_table_file(source_b, destination_b)
+        self.link_table_file(source_c, destination_c)
+        self.link_table_file(source_d, destination_d)
+            
+        # make sure the BUFR tables can be found
+        # also, force a slash at the end, otherwise the library fails
+        # to find the tables (at least this has been the case for many
+        # library versions I worked with)
+        bufr_tables_env = self.private_bufr_tables_dir + os.path.sep
+        if os.environ.get("BUFR_TABLES") != bufr_tables_env:
+            os.environ["BUFR_TABLES"] = bufr_tables_env
+        self.__class__.bufr_tables_env_setting_set_by_script = True
+        
+        self.tables_have_been_setup = True
+        self.table_b_file_to_use = destination_b
+        self.table_c_file_to_use = None
+        if source_c:
+            self.table_c_file_to_use = destination_c
+        self.table_d_file_to_use = destination_d
+        self.table_set_key = (source_b, source_c, source_d)
+
+        # finally load the tables into memory
+        # (only once for each table setup)
+        if table_setup['bt'] is None:
+            bt = BufrTable(tables_dir=self.private_bufr_tables_dir,
+                           verbose=False, report_warnings=False)
+            #              verbose=True, report_warnings=True)
+        
+            # setup_tables already has created the symlinks to the
+            # BUFR tables so don't use this autolink feature for now
+            # bt = BufrTable(autolink_tablesdir=self.private_bufr_tables_dir,
+            #                verbose=False)
+            bt.load(self.table_b_file_to_use)
+            if source_c:
+                bt.load(self.table_c_file_to_use)
+            bt.load(self.table_d_file_to_use)
+            table_setup['bt'] = bt
+        self.bt = table_setup['bt']
+
+        #  #]
+    def find_tables(self, center, subcenter,
+                    LocalVersion, MasterTableVersion,
+                    EditionNumber, MasterTableNumber,
+                    table_b_to_use, table_c_to_use, table_d_to_use,
+                    tables_dir):
+        #  #[ find the table files to use
+        """
+        find the table files to use for the given section 1 parameters
+        and user choices. Returns a dict holding the tuple
+        (destination_b, destination_c, destination_d,
+         source_b, source_c, source_d) of symlink names expected by the
+        library and the (absolute) table files they should point to,
+        and a place to store the BufrTable instance for these tables.
+        """
+        debug=False
+
         ( expected_name_table_b,
           expected_name_table_c,
           expected_name_table_d ) = \
@@ -855,81 +1352,44 @@ class BUFRInterfaceECMWF:
                       'you wish to use')
             raise EcmwfBufrTableError(errtxt)
 
-        # c-tables are not used by the ecmwf bufrdc library,
-        # so this warning is not very useful
-        #if not source_c:
-        #    print('Warning: no matching C table available for B,D tables')
-        #    print('==>', os.path.split(source_b)[1])
-        #    print('==>', os.path.split(source_d)[1])
-            
-        # full names, containing full path, are not nice to print
-        # in the unit tests since they will differ on different
-        # machines, so print the bare filename only
-        if self.verbose:
-            print('Table names expected by the library:')
-            print(os.path.split(destination_b)[1])
-            print(os.path.split(destination_c)[1])
-            print(os.path.split(destination_d)[1])
-            print('Tables to be used:')
-            print(os.path.split(source_b)[1])
-            if source_c:
-                print(os.path.split(source_c)[1])
-            else:
-                print('[C table is missing]')
-            print(os.path.split(source_d)[1])
-        
-        # make sure any old symbolic link is removed
-        # (since it may point to an unwanted location)
-        if ( os.path.islink(destination_b) or
-             os.path.exists(destination_b)   ):
-            os.remove(destination_b)
-        if ( os.path.islink(destination_c) or
-             os.path.exists(destination_c)   ):
-            os.remove(destination_c)
-        if ( os.path.islink(destination_d) or
-             os.path.exists(destination_d)   ):
-            os.remove(destination_d)
-
-        #print("TEST: making symlink from ", source_b,
-        #      " to ", destination_b)
-        os.symlink(os.path.abspath(source_b), destination_b)
-        if source_c:
-            #print("TEST: making symlink from ", source_c,
-            #      " to ", destination_c)
-            os.symlink(os.path.abspath(source_c), destination_c)
-        #print("TEST: making symlink from ", source_d,
-        #      " to ", destination_d)
-        os.symlink(os.path.abspath(source_d), destination_d)
-            
-        # make sure the BUFR tables can be found
-        # also, force a slash at the end, otherwise the library fails
-        # to find the tables (at least this has been the case for many
-        # library versions I worked with)
-        os.environ["BUFR_TABLES"] = (self.private_bufr_tables_dir +
-                                     os.path.sep)
-        self.__class__.bufr_tables_env_setting_set_by_script = True
-        
-        self.tables_have_been_setup = True
-        self.table_b_file_to_use = destination_b
-        self.table_c_file_to_use = None
-        if source_c:
-            self.table_c_file_to_use = destination_c
-        self.table_d_file_to_use = destination_d
-
-        # finally load the tables into memory
-        self.bt = BufrTable(tables_dir=self.private_bufr_tables_dir,
-                            verbose=False, report_warnings=False)
-        #                    verbose=True, report_warnings=True)
-        
-        # setup_tables already has created the symlinks to the BUFR tables
-        # so don't use this autolink feature for now
-        # bt = BufrTable(autolink_tablesdir=self.private_bufr_tables_dir,
-        #                verbose=False)
-        self.bt.load(self.table_b_file_to_use)
         if source_c:
-            self.bt.load(self.table_c_file_to_use)
-        self.bt.load(self.table_d_file_to_use)
+            source_c = os.path.abspath(source_c)
+        files = (destination_b, destination_c, destination_d,
+                 os.path.abspath(source_b), source_c,
+                 os.path.abspath(source_d))
+        return {'files':files, 'bt':None}
+        #  #]
+    def link_table_file(self, source, destination):
+        #  #[ create a symlink to a table file if needed
+        """
+        let destination be a symlink to source, or remove it if
+        source is None. Nothing is done if the link already
+        points to source. The links made are only remembered for
+        a private tables dir, in the shared one the link on disk
+        is always checked, since other processes may have changed it.
+        """
+        links = self.current_table_links
+        if (self.tables_dir_is_private and
+                (destination in links) and (links[destination] == source)):
+            return
 
+        # make sure any old symbolic link is removed
+        # (since it may point to an unwanted location)
+        if ( os.path.islink(destination) or
+             os.path.exists(destination)   ):
+            if source and os.path.islink(destination):
+                if os.readlink(destination) == source:
+                    if self.tables_dir_is_private:
+                        links[destination] = source
+                    return
+            os.remove(destination)
+
+        if source:
+            #print("TEST: making symlink from ", source,
+            #      " to ", destination)
+            os.symlink(source, destination)
+        if self.tables_dir_is_private:
+            links[destination] = source
         #  #]
     def print_sections_012(self):
         #  #[ wrapper for buprs0, buprs1, buprs2
@@ -946,13 +1406,13 @@ class BUFRInterfaceECMWF:
 
         print('------------------------------')
         print("printing content of section 0:")
-        self.store_fortran_stdout()
+        self.store_fortran_stdout(capture=True)
         ecmwfbufr.buprs0(self.ksec0)
         lines = self.get_fortran_stdout()
         self.display_fortran_stdout(lines)
         print('------------------------------')
         print("printing content of section 1:")
-        self.store_fortran_stdout()
+        self.store_fortran_stdout(capture=True)
         ecmwfbufr.buprs1(self.ksec1)
         lines = self.get_fortran_stdout()
         self.display_fortran_stdout(lines)
@@ -964,7 +1424,7 @@ class BUFRInterfaceECMWF:
             print('------------------------------')
             print("calling buukey")
             kerr = 0
-            self.store_fortran_stdout()
+            self.store_fortran_stdout(capture=True)
             ecmwfbufr.buukey(self.ksec1,
                              self.ksec2,
                              self.key,
@@ -973,7 +1433,7 @@ class BUFRInterfaceECMWF:
             lines = self.get_fortran_stdout()
             self.display_fortran_stdout(lines)
             print("printing content of section 2:")
-            self.store_fortran_stdout()
+            self.store_fortran_stdout(capture=True)
             ecmwfbufr.buprs2(self.ksup,
                              self.key)
             lines = self.get_fortran_stdout()
@@ -996,7 +1456,16 @@ class BUFRInterfaceECMWF:
                       "to use, by calling the setup_tables() method, before "+
                       "you can actually decode a BUFR message.")
             raise EcmwfBufrLibError(errtxt)
-                     
+
+        if self.decoder == 'numpy':
+            try:
+                self.decode_data_numpy()
+                return
+            except NotYetImplementedError as err:
+                if self.verbose:
+                    print('numpy decoder not usable: '+str(err))
+                    print('falling back to the bufrex decoder')
+
         # fill the descriptor list arrays ktdexp and ktdlst
         # this is not strictly needed before entering the decoding
         # but is is the only way to get an accurate value of the actual
@@ -1011,7 +1480,7 @@ class BUFRInterfaceECMWF:
         # Howver, this is required to allocated the needed arrays to interface
         # with the ecmwf library, so there is no easy workaround here.
         self.extract_raw_descriptor_list()
-        self.expand_raw_descriptor_list()
+        self.template_info = self.get_template_info()
         # this last method also sets: self.delayed_repl_present
 
         # after these 2 method calls, these arrays and variables are filled:
@@ -1056,19 +1525,45 @@ class BUFRInterfaceECMWF:
         # final expanded descriptor list. This final list may be
         # smaller in some cases (for example for ERS2 data) than
         # the maximum intermediate size needed....
-        if self.py_expanded_descr_list:
+        max_nr_of_descriptors = None
+        if self.delayed_repl_present:
+            # the number of elements depends on the data, but it
+            # cannot be larger than the section 4 size allows
+            max_nr_of_descriptors = \
+                     self.get_max_nr_of_descriptors(nr_of_subsets)
+
+        if 'nr_of_descriptors' in self.template_info:
+            # use the size that worked for a previous message
+            # with the same template
+            nr_of_descriptors = self.template_info['nr_of_descriptors']
+        elif max_nr_of_descriptors is not None:
+            nr_of_descriptors = max_nr_of_descriptors
+        elif self.py_expanded_descr_list:
             nr_of_descriptors = len(self.py_expanded_descr_list)
         else:
             nr_of_descriptors = self.nr_of_descriptors_startval
+        # a size of 0 would never grow by the multiplier below
+        nr_of_descriptors = max(1, nr_of_descriptors)
 
+        failed_nr_of_descriptors = None
         increment_arraysize = True
         while increment_arraysize:
+            last_try = (int(nr_of_descriptors *
+                            self.nr_of_descriptors_multiplier) >
+                        self.nr_of_descriptors_maxval)
             try:
-                self.try_decode_data(nr_of_descriptors, nr_of_subsets)
+                self.try_decode_data(nr_of_descriptors, nr_of_subsets,
+                                     last_try)
                 increment_arraysize = False
             except EcmwfBufrLibError as e:
+                failed_nr_of_descriptors = nr_of_descriptors
                 nr_of_descriptors = int(nr_of_descriptors *
                                         self.nr_of_descriptors_multiplier)
+                if ((max_nr_of_descriptors is not None) and
+                        (failed_nr_of_descriptors < max_nr_of_descriptors <
+                         nr_of_descriptors)):
+                    # no need to go beyond the upper bound
+                    nr_of_descriptors = max_nr_of_descriptors
                 if nr_of_descriptors>self.nr_of_descriptors_maxval:
                     lines = self.get_fortran_stdout()
                     self.display_fortran_stdout(lines)
@@ -1079,6 +1574,22 @@ class BUFRInterfaceECMWF:
                               nr_of_descriptors)
         # done
         self.actual_nr_of_expanded_descriptors = self.ksup[4]
+
+        # remember the largest size needed for this template.
+        # The upper bound is usually much too large, so in that case
+        # store the number of elements bufrex found (plus the operators,
+        # which take a place in the arrays during decoding)
+        nr_needed = nr_of_descriptors
+        if nr_of_descriptors == max_nr_of_descriptors:
+            nr_needed = (self.ksup[4] +
+                         (self.template_info.get('num_operators') or 0))
+            if failed_nr_of_descriptors is not None:
+                nr_needed = max(nr_needed,
+                                int(failed_nr_of_descriptors *
+                                    self.nr_of_descriptors_multiplier))
+            nr_needed = min(nr_needed, nr_of_descriptors)
+        if nr_needed > self.template_info.get('nr_of_descriptors', 0):
+            self.template_info['nr_of_descriptors'] = nr_needed
         
         # if self.py_expanded_descr_list:
         #     self.actual_nr_of_expanded_descriptors = \
@@ -1097,8 +1608,93 @@ class BUFRInterfaceECMWF:
         # print('self.ksup[6] = ', self.ksup[6] # real num of elements in cvals)
 
         #  #]
-    def try_decode_data(self, nr_of_descriptors, nr_of_subsets):
+    def decode_data_numpy(self):
+        #  #[ decode section 4 without using bufrex
+        """
+        decode the data section using the pure numpy implementation
+        in numpy_decoder.py in stead of the bufrex routine.
+        This handles compressed data, and uncompressed data without
+        delayed replication.
+        Raises NotYetImplementedError if the message uses features
+        not handled by this decoder, in which case the bufrex
+        routine should be used.
+        """
+        if (not self.sections012_decoded):
+            errtxt = ("Sorry, the decode_sections012 subroutine needs to "+
+                      "be called before entering the decode_data_numpy "+
+                      "subroutine.")
+            raise EcmwfBufrLibError(errtxt)
+
+        if not self.tables_have_been_setup:
+            errtxt = ("Sorry, you need to tell this module which BUFR tables "+
+                      "to use, by calling the setup_tables() method, before "+
+                      "you can actually decode a BUFR message.")
+            raise EcmwfBufrLibError(errtxt)
+
+        self.extract_raw_descriptor_list()
+        self.template_info = self.get_template_info()
+
+        if self.delayed_repl_present and not self.py_compressed:
+            # each subset may have a different layout
+            raise NotYetImplementedError('delayed replication is only '+
+                                         'supported for compressed data')
+
+        # reuse the decoder (and its cache of table D sequences)
+        # for all messages using the same set of tables
+        decoder = self.numpy_decoders.get(self.table_set_key)
+        if decoder is None:
+            decoder = NumpyBUFRDecoder(self.bt, verbose=self.verbose)
+            self.numpy_decoders[self.table_set_key] = decoder
+
+        msg_bytes = np.asarray(self.encoded_message).astype(
+            '<i4', copy=False).view('u1')
+        decoder.decode(msg_bytes, self.section_start_locations[4],
+                       self.py_unexp_descr_array, self.py_num_subsets,
+                       compressed=self.py_compressed)
+
+        # store the results in the same way as try_decode_data does
+        self.values = decoder.values
+        self.cvals = decoder.cvals
+        self.actual_kelem = decoder.num_elements
+        self.kvals = len(self.values)
+        self.cnames = decoder.cnames
+        self.cunits = decoder.cunits
+        self.ktdlst = self.py_unexp_descr_array.astype(int)
+        self.ktdlen = len(self.ktdlst)
+        self.ktdexp = decoder.expanded_descriptors
+        self.ktdexl = len(self.ktdexp)
+        self.ksup[4] = self.ktdexl
+        self.actual_nr_of_expanded_descriptors = self.ktdexl
+
+        # fill ksec3 in the same way as bufrex and bus0123 do,
+        # so decode_sections_0123 is not needed
+        self.ksec3[0] = self.section_sizes[3]
+        self.ksec3[2] = self.py_num_subsets
+        self.ksec3[3] = self.py_section3_flags
+        self.sections0123_decoded = True
+
+        self.decoded_with_numpy = True
+        self.descriptors_list_filled = True
+        self.descriptors_list_subset = None
+        self.data_decoded = True
+        #  #]
+    def allocate(self, name, shape, dtype, zeroed=True):
+        #  #[ allocate a zero filled decoding array
+        """
+        returns a zero filled array, taken from the buffer arena
+        if one was provided (see DecodeBufferArena.get_buffer for
+        the zeroed flag)
+        """
+        if self.buffer_arena is None:
+            return np.zeros(shape, dtype=dtype)
+        return self.buffer_arena.get_buffer(name, shape, dtype, zeroed)
+        #  #]
+    def try_decode_data(self, nr_of_descriptors, nr_of_subsets,
+                        last_try=True):
         #  #[ try decoding for a given array length
+        # (last_try is False if decode_data will retry with larger
+        #  arrays after a failure, in which case a failed call is
+        #  not run again to capture the discarded fortran stdout)
 
         kerr = 0
 
@@ -1118,10 +1714,15 @@ class BUFRInterfaceECMWF:
 
         # allocate space for decoding
         # note: float64 is the default, but it doesn't hurt to make it explicit
-        self.values = np.zeros(      self.kvals, dtype = np.float64)
-        self.cvals  = np.zeros((self.kvals, 80), dtype = 'S1')
-        self.cnames = np.zeros((nr_of_descriptors, 64), dtype = '|S1')
-        self.cunits = np.zeros((nr_of_descriptors, 24), dtype = '|S1')
+        self.values = self.allocate('values', self.kvals, np.float64)
+        # bufrex only checks the string positions against kvals, so
+        # cvals needs a row for each value. Only the rows it writes are
+        # touched (np.zeros gets untouched pages from the OS for free),
+        # and it is shrunk to the number of strings after decoding.
+        self.cvals  = self.allocate('cvals', (self.kvals, 80), 'S1',
+                                    zeroed=False)
+        self.cnames = self.allocate('cnames', (nr_of_descriptors, 64), '|S1')
+        self.cunits = self.allocate('cunits', (nr_of_descriptors, 24), '|S1')
 
         # print('DEBUG: len(self.ksec0)=',len(self.ksec0))
         # print('DEBUG: len(self.ksec1)=',len(self.ksec1))
@@ -1133,25 +1734,29 @@ class BUFRInterfaceECMWF:
         # print('DEBUG: len(self.values)=',len(self.values))
         # print('DEBUG: len(self.cvals)=',len(self.cvals))
 
+        def run_bufrex(*args):
+            # reset global variables to enter the decoding process
+            # (this does not happen in the bufrdc library, which is a bug)
+            ecmwfbufr.reset_global_vars()
+            ecmwfbufr.bufrex(*args)
+
+        args = (self.encoded_message, # input
+                self.ksup,   # output
+                self.ksec0,  # output
+                self.ksec1,  # output
+                self.ksec2,  # output
+                self.ksec3,  # output
+                self.ksec4,  # output
+                self.cnames, # output
+                self.cunits, # output
+                self.values, # output
+                self.cvals,  # output
+                kerr)        # output
+
         # catch stdout from the fortran code
         self.store_fortran_stdout()
 
-        # reset global variables to enter the decoding process
-        # (this does not happen in the bufrdc library, which is a bug)
-        ecmwfbufr.reset_global_vars()
-        
-        ecmwfbufr.bufrex(self.encoded_message, # input
-                         self.ksup,   # output
-                         self.ksec0,  # output
-                         self.ksec1,  # output
-                         self.ksec2,  # output
-                         self.ksec3,  # output
-                         self.ksec4,  # output
-                         self.cnames, # output
-                         self.cunits, # output
-                         self.values, # output
-                         self.cvals,  # output
-                         kerr)        # output
+        run_bufrex(*args)
         lines = self.get_fortran_stdout()
         # self.display_fortran_stdout(lines)
 
@@ -1178,10 +1783,25 @@ class BUFRInterfaceECMWF:
         # contain the length of the encoded section 4 in bytes, so if it
         # remains zero something is very wrong):
         if self.ksec4[0] == 0:
+            if self.fortran_stdout_discarded and last_try:
+                lines = self.rerun_with_fortran_stdout(run_bufrex, args)
             errtxt = self.analyse_errors_in_fortran_stdout(lines,'bufrex')
             raise EcmwfBufrLibError(errtxt)
+
+        # keep only the strings bufrex stored (ksup[6] holds their
+        # number), copied to release the full size array
+        num_cvals = max(1, min(self.ksup[6], self.kvals))
+        if self.buffer_arena is None:
+            self.cvals = self.cvals[:num_cvals, :].copy()
+        else:
+            self.cvals = self.cvals[:num_cvals, :]
         
+        # bufrex also fills ksec0 upto ksec3, so
+        # calling decode_sections_0123 is not needed anymore
+        self.sections0123_decoded = True
         self.data_decoded = True
+        # descriptor lists filled before decoding should not be reused
+        self.descriptors_list_subset = 0
         # self.BufrTemplate = ...
         #  #]
     def print_sections_012_metadata(self):
@@ -1280,6 +1900,10 @@ class BUFRInterfaceECMWF:
             # each subset may have a different list of descriptors
             # after expansion, so reload the list of names for this subset
             self.expand_descriptors_for_decoding(subset)
+        elif self.descriptors_list_filled_from_cache():
+            # no need to convert them again
+            return (list(self.template_info['names']),
+                    list(self.template_info['units']))
 
         list_of_names = []
         list_of_units = []
@@ -1392,19 +2016,10 @@ class BUFRInterfaceECMWF:
         #  #]
     def convert_flag_values_to_text(self, values, i):
         #  #[ convert flags to text if needed
-        flag_text_values = []
         ref = int(self.ktdexp[i])
-        unit = ''.join(c.decode() for c in self.cunits[i])
-        if 'TABLE' in unit:
+        if b'TABLE' in self.cunits[i].tobytes():
             if ref in self.bt.table_c:
-                for v in values:
-                    try:
-                        flag_text = self.bt.table_c[ref].flag_dict[int(v)]
-                    except:
-                        flag_text = '<UNDEFINED VALUE>'
-                    flag_text_values.append(flag_text)
-
-                return flag_text_values
+                return self.bt.table_c[ref].lookup(values).tolist()
 
         # default fallback in case flag seems not defined
         # or C-table is missing or descriptor is numeric after all
@@ -1443,17 +2058,8 @@ class BUFRInterfaceECMWF:
         value = self.values[selection]
 
         if autoget_cval:
-            descr = self.ktdexp[i]
-            try:
-                unit = self.bt.table_b[descr].unit
-                if unit == 'CCITTIA5':
-                    cvals_index = int(value/1000)-1
-                    text = ''.join(c for c in self.cvals[cvals_index,:])
-                    return text.strip()
-            except:
-                # this may happen for ModificationCommand descriptors
-                # like 224000, since these have no unit attribute
-                pass
+            if i in self.get_ccittia5_positions():
+                return self.get_strings_from_cvals([value,])[0]
 
         if self.expand_flags:
             values = self.convert_flag_values_to_text([value,], i)
@@ -1497,17 +2103,8 @@ class BUFRInterfaceECMWF:
         values = self.values[selection]
 
         if autoget_cval:
-            cvalues = []
-            exp_descr_list_length = self.ktdexl
-            template_offset = selection % exp_descr_list_length
-            descr = self.ktdexp[template_offset]
-            unit = self.bt.table_b[descr[0]].unit
-            if unit == 'CCITT IA5':
-                for subset in range(nsubsets):
-                    cvals_index = int(values[subset]/1000)-1
-                    text = ''.join(c for c in self.cvals[cvals_index,:])
-                    cvalues.append(text.strip())
-                return cvalues
+            if i in self.get_ccittia5_positions():
+                return self.get_strings_from_cvals(values)
 
         if self.expand_flags:
             values = self.convert_flag_values_to_text(values, i)
@@ -1549,26 +2146,20 @@ class BUFRInterfaceECMWF:
             return
 
         if autoget_cval:
-            # convert numpy values array to standard list to make it mutable
-            values = list(values)
-            for i, descr in enumerate(self.ktdexp):
-                try:
-                    unit = self.bt.table_b[descr].unit
-                    if unit == 'CCITTIA5':
-                        selection = self.actual_kelem*(subset_nr-1) + i
-                        cvals_index = int(values[selection]/1000)-1
-                        text = ''.join(c.decode() for c in
-                                       self.cvals[cvals_index,:])
-                        cvalue = text.strip()
-                        values[i] = cvalue
-                except AttributeError:
-                    # this may happen for ModificationCommand descriptors
-                    # like 224000, since these have no unit attribute
-                    pass
+            # convert numpy values array to type object to allow
+            # inserting the strings
+            values = values.astype(object)
+            positions = self.get_ccittia5_positions()
+            if len(positions) > 0:
+                values[positions] = \
+                        self.get_strings_from_cvals(values[positions])
 
         if self.expand_flags:
-            values = [self.convert_flag_values_to_text([value,], i)[0]
-                      for i, value in enumerate(values)]
+            values = values.astype(object)
+            for i in self.get_flag_positions():
+                ref = int(self.ktdexp[i])
+                if ref in self.bt.table_c:
+                    values[i] = self.bt.table_c[ref].lookup(values[i])[()]
 
         if self.expand_flags or autoget_cval:
             # finally convert to a numpy array of type object
@@ -1578,6 +2169,88 @@ class BUFRInterfaceECMWF:
         # print('i, self.values[selection] = '+str(i)+' '+str(values))
         return values
         #  #]
+    def get_ccittia5_positions(self):
+        #  #[ positions of the string elements
+        """
+        returns an array with the positions of the CCITTIA5 (string)
+        elements in the expanded descriptor list of the current subset
+        """
+        if self.descriptors_list_filled_from_cache():
+            return self.template_info['ccittia5_positions']
+
+        units = np.char.strip(self.cunits[:self.ktdexl].view('S24')[:, 0])
+        return np.where(units == b'CCITTIA5')[0]
+        #  #]
+    def get_flag_positions(self):
+        #  #[ positions of the flag and code table elements
+        """
+        returns an array with the positions of the flag and code table
+        elements in the expanded descriptor list of the current subset
+        """
+        if self.descriptors_list_filled_from_cache():
+            return self.template_info['flag_positions']
+
+        units = self.cunits[:self.ktdexl].view('S24')[:, 0]
+        return np.where(np.char.find(units, b'TABLE') >= 0)[0]
+        #  #]
+    def convert_flag_columns_to_text(self, values):
+        #  #[ convert flags to text for a 2D array
+        """
+        convert the flag and code table columns of a 2D values array
+        (as returned by get_values_as_2d_array) to text.
+        Returns a new 2D array of type object.
+        """
+        result = values.astype(object)
+        for i in self.get_flag_positions():
+            if i >= values.shape[1]:
+                continue
+            ref = int(self.ktdexp[i])
+            if ref in self.bt.table_c:
+                result[:, i] = self.bt.table_c[ref].lookup(values[:, i])
+        return result
+        #  #]
+    def get_strings_from_cvals(self, values):
+        #  #[ convert references to the cvals array into strings
+        """
+        convert an array of values of CCITTIA5 elements, which hold
+        references to the cvals array, to a (numpy) array of strings
+        with the same shape. Invalid references (i.e. for missing
+        values) result in empty strings.
+        """
+        # view each row of 80 characters as a single string
+        records = self.cvals.view('S80')[:, 0]
+
+        values = np.asarray(values, dtype=np.float64)
+        present = (values < MISSING_INDICATOR)
+        cvals_index = (np.where(present, values, 0)/1000).astype(np.int64) - 1
+        valid = present & (cvals_index >= 0) & (cvals_index < len(records))
+
+        strings = np.zeros(values.shape, dtype='S80')
+        strings[valid] = records[cvals_index[valid]]
+        return np.char.strip(np.char.decode(strings, 'latin-1'))
+        #  #]
+    def get_strings_as_2d_array(self):
+        #  #[ get all strings of the message at once
+        """
+        returns the positions of the CCITTIA5 elements in the expanded
+        descriptor list, and a 2D array of strings, in which the first
+        index runs over the subsets, the second over these positions.
+        This is only possible if no delayed replication is present.
+        """
+        if (not self.data_decoded):
+            errtxt = ("Sorry, retrieving values is only possible after "+
+                      "a BUFR message has been decoded with a call to "+
+                      "decode_data")
+            raise EcmwfBufrLibError(errtxt)
+
+        self.delayed_repl_check_for_incorrect_use()
+
+        nsubsets  = self.get_num_subsets()
+        positions = self.get_ccittia5_positions()
+        selection = (self.actual_kelem*np.arange(nsubsets)[:, np.newaxis] +
+                     positions[np.newaxis, :])
+        return (positions, self.get_strings_from_cvals(self.values[selection]))
+        #  #]
     def get_element_name_and_unit(self, i):
         #  #[ routine to get name and unit of a given element
         """
@@ -1624,6 +2297,204 @@ class BUFRInterfaceECMWF:
                        'messages.')
             raise IncorrectUsageError(errtxt)
         #  #]
+    def get_template_info(self):
+        #  #[ lookup or create the template_cache entry
+        """
+        get the template_cache entry for the unexpanded descriptor
+        list of the current message. If it is not yet present the
+        descriptor list is expanded and a new entry is created.
+        The entry is a dict which may hold:
+        expanded_descr_list, delayed_repl_present: the results of
+                     expand_raw_descriptor_list
+        nr_of_descriptors: the array size needed to decode this template
+        kelem, ktdlst, ktdexp, cnames, cunits, names, units,
+        ccittia5_positions, flag_positions: the results of busel2 and
+                     derived values (only for templates without
+                     delayed replication)
+        """
+        key = (self.table_set_key, self.py_unexp_descr_array.tobytes())
+        template_info = self.__class__.template_cache.get(key)
+        if template_info is not None:
+            self.__class__.template_cache.move_to_end(key)
+            self.py_expanded_descr_list = \
+                     template_info['expanded_descr_list']
+            self.delayed_repl_present = template_info['delayed_repl_present']
+            return template_info
+
+        self.expand_raw_descriptor_list()
+
+        template_info = {'expanded_descr_list':self.py_expanded_descr_list,
+                         'delayed_repl_present':self.delayed_repl_present}
+        self.__class__.template_cache[key] = template_info
+        while (len(self.__class__.template_cache) >
+               max(1, self.max_template_cache_size)):
+            self.__class__.template_cache.popitem(last=False)
+        return template_info
+        #  #]
+    def get_template_bit_info(self):
+        #  #[ minimum data width and number of operators in the template
+        """
+        walk the unexpanded descriptor list, including all table D
+        sequences, and return the minimum data width of the table B
+        elements, the number of modification operators it contains
+        and the minimum number of bits used by one subset (the sum
+        of the widths of the elements that are not replicated).
+        Returns (None, None, None) if no reliable minimum width can be
+        given, i.e. if the template changes data widths with operators.
+        The result is stored in the template_cache entry.
+        """
+        if 'min_data_width' in self.template_info:
+            return (self.template_info['min_data_width'],
+                    self.template_info['num_operators'],
+                    self.template_info['min_subset_bits'])
+
+        # results per table D sequence, since these are often reused
+        sequence_info = {}
+
+        def walk(references):
+            """ returns (min_width, num_operators, min_bits) for a list """
+            min_width = None
+            num_operators = 0
+            min_bits = 0
+            # number of following descriptors that are replicated
+            num_replicated = 0
+            delayed_count = None
+            for reference in references:
+                # replicated elements may be present zero times,
+                # so they do not add to the minimum number of bits
+                replicated = (num_replicated > 0)
+                if replicated:
+                    num_replicated -= 1
+                if delayed_count is not None:
+                    # this is the delayed replication factor,
+                    # the replicated descriptors follow after it
+                    num_replicated = max(num_replicated, delayed_count)
+                    delayed_count = None
+                f_val = reference//100000
+                if f_val == 0:
+                    width = self.bt.table_b[reference].data_width
+                    if (min_width is None) or (width < min_width):
+                        min_width = width
+                    if not replicated:
+                        min_bits += width
+                elif f_val == 1:
+                    x_val = (reference//1000) % 100
+                    if reference % 1000 == 0:
+                        delayed_count = x_val
+                    else:
+                        num_replicated = max(num_replicated, x_val)
+                elif f_val == 2:
+                    x_val = (reference//1000) % 100
+                    # 201: change data width, 206: local descriptors,
+                    # 208: change width of character data
+                    if x_val in (1, 6, 8):
+                        raise ValueError('data width changed by operator')
+                    num_operators += 1
+                elif f_val == 3:
+                    if reference not in sequence_info:
+                        sequence_info[reference] = walk(
+                            [d.reference for d in
+                             self.bt.table_d[reference].descriptor_list])
+                    (seq_min_width, seq_num_operators, seq_min_bits) = \
+                                    sequence_info[reference]
+                    if (seq_min_width is not None and
+                            (min_width is None or seq_min_width < min_width)):
+                        min_width = seq_min_width
+                    num_operators += seq_num_operators
+                    if not replicated:
+                        min_bits += seq_min_bits
+            return (min_width, num_operators, min_bits)
+
+        try:
+            (min_width, num_operators, min_subset_bits) = \
+                        walk(self.py_unexp_descr_array.tolist())
+        except (ValueError, KeyError, AttributeError):
+            (min_width, num_operators, min_subset_bits) = (None, None, None)
+
+        if not min_width:
+            (min_width, num_operators, min_subset_bits) = (None, None, None)
+
+        self.template_info['min_data_width'] = min_width
+        self.template_info['num_operators'] = num_operators
+        self.template_info['min_subset_bits'] = min_subset_bits
+        return (min_width, num_operators, min_subset_bits)
+        #  #]
+    def get_max_nr_of_descriptors(self, nr_of_subsets):
+        #  #[ upper bound for the number of expanded descriptors
+        """
+        calculate an upper bound for the number of expanded descriptors
+        per subset from the length of section 4 and the minimum data
+        width used in the template. This allows decoding messages with
+        delayed replication in one go.
+        Returns None if no bound can be given, or if the resulting
+        arrays would become too large.
+        """
+        (min_width, num_operators, min_subset_bits) = \
+                    self.get_template_bit_info()
+        if min_width is None:
+            return None
+
+        # section 4 starts with 4 header bytes
+        num_bits = 8*(self.section_sizes[4]-4)
+        if self.py_compressed:
+            # for compressed data each element takes at least
+            # the reference value and the 6 bit increment width,
+            # and all subsets have the same elements
+            max_nr_of_values = num_bits//(min_width+6)
+        else:
+            # the subsets share section 4, so a single subset can
+            # only use the bits not needed by the other subsets
+            num_bits -= (nr_of_subsets-1)*min_subset_bits
+            max_nr_of_values = max(0, num_bits)//min_width
+
+        # operators take no bits, but do take a place in the arrays
+        # during decoding
+        nr_of_descriptors = max_nr_of_values + num_operators
+
+        if nr_of_descriptors*nr_of_subsets > self.nr_of_descriptors_maxval:
+            return None
+        return nr_of_descriptors
+        #  #]
+    def descriptors_list_filled_from_cache(self):
+        #  #[ check if the cached busel2 results apply
+        """
+        check if the cached busel2 results for the current template can be
+        used. This is only the case when no delayed replication is present
+        and the arrays have the size used to decode the current message.
+        """
+        return ((self.template_info is not None) and
+                (not self.delayed_repl_present) and
+                (self.template_info.get('kelem') == self.actual_kelem))
+        #  #]
+    def store_descriptor_lists_in_cache(self):
+        #  #[ add the busel2 results to the template_cache entry
+        """
+        store the descriptor lists, names and units returned by busel2
+        in the template cache, together with the positions of the string
+        and flag/code table elements in the expanded descriptor list.
+        """
+        units = [b''.join(self.cunits[i, :]).strip().decode()
+                 for i in range(self.ktdexl)]
+        names = [b''.join(self.cnames[i, :]).strip().decode()
+                 for i in range(self.ktdexl)]
+        ccittia5_positions = [i for (i, unit) in enumerate(units)
+                              if unit == 'CCITTIA5']
+        flag_positions = [i for (i, unit) in enumerate(units)
+                          if 'TABLE' in unit]
+
+        # copy the arrays, since they may be views on a buffer arena
+        self.template_info.update({'kelem':self.actual_kelem,
+                                   'ktdlst':self.ktdlst,
+                                   'ktdexp':self.ktdexp,
+                                   'cnames':self.cnames.copy(),
+                                   'cunits':self.cunits.copy(),
+                                   'names':names,
+                                   'units':units,
+                                   'ccittia5_positions':
+                                   np.array(ccittia5_positions, dtype=int),
+                                   'flag_positions':
+                                   np.array(flag_positions, dtype=int)})
+        #  #]
     def extract_raw_descriptor_list(self):
         #  #[ extract the raw descriptor list from the binary bufr msg
         """
@@ -1651,25 +2522,21 @@ class BUFRInterfaceECMWF:
 
         # assume little endian for now when converting
         # raw bytes/characters to integers and vice-versa
-        dataformat = "<i"
-        size_words = len(self.encoded_message)
-        size_bytes = size_words*4
-
-        list_of_raw_data_bytes = []
-        for (i, word) in enumerate(self.encoded_message):
-            list_of_raw_data_bytes.append(struct.pack(dataformat, word))
-        raw_data_bytes = b''.join(rdb for rdb in list_of_raw_data_bytes)
+        # (this view does not copy the data if the words are stored
+        # as little endian 4 byte integers already)
+        raw_data_bytes = np.asarray(self.encoded_message).\
+                         astype('<i4', copy=False).view('u1')
 
         # note: the headers seem to use big-endian encoding
         # even on little endian machines, for the msg size.
-        dataformat = ">1i"
-        
         start_section3 = self.section_start_locations[3]
         # print('start_section3 = ',start_section3)
         # extract the number of subsets from bytes 5 and 6
-        raw_bytes = b'\x00'*2+raw_data_bytes[start_section3+5-1:
-                                             start_section3+6]
-        self.py_num_subsets = struct.unpack(dataformat, raw_bytes)[0]
+        self.py_num_subsets = (256*int(raw_data_bytes[start_section3+4]) +
+                               int(raw_data_bytes[start_section3+5]))
+        # bit 2 of byte 7 is the compression flag
+        self.py_section3_flags = int(raw_data_bytes[start_section3+6])
+        self.py_compressed = bool(self.py_section3_flags & 64)
         # print('self.py_num_subsets = ',self.py_num_subsets)
 
         # print('length section3: ', self.section_sizes[3])
@@ -1677,17 +2544,17 @@ class BUFRInterfaceECMWF:
         # print('num descriptors: ',num_descriptors)
 
         # do the actual extraction of the raw/unexpanded descriptors
-        self.py_unexp_descr_list = []
-        for i in range(num_descriptors):
-            # extract the unexpanded descriptors
-            raw_bytes = raw_data_bytes[start_section3+8-1+i*2:
-                                       start_section3+8+1+i*2]
-            #print('raw_bytes = '+'.'.join(str(ord(b)) for b in raw_bytes))
-            f = (ord(raw_bytes[0:1]) & (128+64))//64
-            x = ord(raw_bytes[0:1]) & (64-1)
-            y = ord(raw_bytes[1:2])
-            #print('extracted descriptor: f,x,y = %1.1i.%2.2i.%3.3i' % (f,x,y))
-            self.py_unexp_descr_list.append('%1.1i%2.2i%3.3i' % (f,x,y))
+        # each descriptor takes 2 bytes: f (2 bits), x (6 bits), y (8 bits)
+        start = start_section3+7
+        raw_bytes = raw_data_bytes[start:start+2*num_descriptors].\
+                    astype(int).reshape(num_descriptors, 2)
+        f = raw_bytes[:, 0] >> 6
+        x = raw_bytes[:, 0] & 63
+        y = raw_bytes[:, 1]
+        # store them as integers of the form FXXYYY
+        self.py_unexp_descr_array = 100000*f + 1000*x + y
+        self.py_unexp_descr_list = ['%6.6i' % d for d in
+                                    self.py_unexp_descr_array.tolist()]
 
         # print('self.py_unexp_descr_list = ',self.py_unexp_descr_list)
         # print('with length = ',len(self.py_unexp_descr_list))
@@ -1791,15 +2658,18 @@ class BUFRInterfaceECMWF:
 
         if self.verbose:
             print("calling: ecmwfbufr.busel():")
+        args = (self.ktdlen, # actual number of data descriptors
+                self.ktdlst, # list of data descriptors
+                self.ktdexl, # actual nr of expanded data descriptors
+                self.ktdexp, # list of expanded data descriptors
+                kerr)        # error  message
         self.store_fortran_stdout()
-        ecmwfbufr.busel(self.ktdlen, # actual number of data descriptors
-                        self.ktdlst, # list of data descriptors
-                        self.ktdexl, # actual nr of expanded data descriptors
-                        self.ktdexp, # list of expanded data descriptors
-                        kerr)   # error  message
+        ecmwfbufr.busel(*args)
         lines = self.get_fortran_stdout()
         self.display_fortran_stdout(lines)
         if (kerr != 0):
+            lines = self.rerun_with_fortran_stdout(ecmwfbufr.busel, args)
+            self.display_fortran_stdout(lines)
             raise EcmwfBufrLibError(self.explain_error(kerr, 'busel'))
 
         # It is not clear to me why busel seems to correctly produce
@@ -1836,6 +2706,39 @@ class BUFRInterfaceECMWF:
         # Therefore it only produces correct results when either bus012
         # or bufrex have been called previously on the same bufr message.....
 
+        # the numpy decoder already filled the lists, which
+        # are identical for all subsets for the data it handles
+        if self.decoded_with_numpy:
+            return
+
+        # lists filled after decoding the data remain valid, for all
+        # subsets if no delayed replication is present, and otherwise
+        # for the subset they were filled for
+        if ( self.data_decoded and self.descriptors_list_filled and
+             (self.descriptors_list_subset in (None, subset)) ):
+            return
+
+        # without delayed replication all subsets and all messages
+        # with the same template give the same result, so if this
+        # template has been seen before, take the result from the cache
+        if self.descriptors_list_filled_from_cache():
+            self.ktdlst = self.template_info['ktdlst']
+            self.ktdlen = len(self.ktdlst)
+            self.ktdexp = self.template_info['ktdexp']
+            self.ktdexl = len(self.ktdexp)
+            self.cnames = self.template_info['cnames']
+            self.cunits = self.template_info['cunits']
+            self.ksup[4] = self.ktdexl
+            self.descriptors_list_filled = True
+            self.descriptors_list_subset = None
+            return
+
+        # bufrex already returned the names and units, so for templates
+        # without delayed replication only the descriptor lists are
+        # missing, and these follow from the python expansion
+        if self.fill_descriptor_list_from_template():
+            return
+
         # kelem  = 500 #self.max_nr_expanded_descriptors
         kerr   = 0
 
@@ -1843,16 +2746,15 @@ class BUFRInterfaceECMWF:
 
         # define space for decoding text strings
         kelem  = self.actual_kelem
-        self.cnames = np.zeros((kelem, 64), dtype = '|S1')
-        self.cunits = np.zeros((kelem, 24), dtype = '|S1')
+        self.cnames = self.allocate('cnames', (kelem, 64), '|S1')
+        self.cunits = self.allocate('cunits', (kelem, 24), '|S1')
 
         # arrays to hold the descriptors
         self.ktdlen = 0 # will hold nr of descriptors
         self.ktdlst = np.zeros(actual_nr_of_descriptors,
                                dtype = int)
         self.ktdexl = 0 # will hold nr of expanded descriptors
-        self.ktdexp = np.zeros(kelem,
-                               dtype = int)
+        self.ktdexp = self.allocate('ktdexp', kelem, int)
     
         if self.verbose:
             print("calling: ecmwfbufr.busel2():")
@@ -1868,20 +2770,23 @@ class BUFRInterfaceECMWF:
             # print('self.actual_kelem = ', self.actual_kelem)
 
         # print('DEBUG: len(self.ktdexp) = ', len(self.ktdexp))
+        args = (subset,      # subset to be inspected
+                kelem,       # Max number of expected elements
+                # outputs:
+                self.ktdlen, # actual number of data descriptors
+                self.ktdlst, # list of data descriptors
+                self.ktdexl, # actual nr of expanded data descriptors
+                self.ktdexp, # list of expanded data descriptors
+                self.cnames, # descriptor names
+                self.cunits, # descriptor units
+                kerr)        # error code
         self.store_fortran_stdout()
-        ecmwfbufr.busel2(subset,      # subset to be inspected
-                         kelem,       # Max number of expected elements
-                         # outputs:
-                         self.ktdlen, # actual number of data descriptors
-                         self.ktdlst, # list of data descriptors
-                         self.ktdexl, # actual nr of expanded data descriptors
-                         self.ktdexp, # list of expanded data descriptors
-                         self.cnames, # descriptor names
-                         self.cunits, # descriptor units
-                         kerr)        # error code
+        ecmwfbufr.busel2(*args)
         lines = self.get_fortran_stdout()
         self.display_fortran_stdout(lines)
         if (kerr != 0):
+            lines = self.rerun_with_fortran_stdout(ecmwfbufr.busel2, args)
+            self.display_fortran_stdout(lines)
             raise EcmwfBufrLibError(self.explain_error(kerr, 'busel2'))
 
         # print('DEBUG: call to busel2 finished')
@@ -1899,9 +2804,56 @@ class BUFRInterfaceECMWF:
         self.ktdexp = self.ktdexp[selection2]
         self.ktdexl = len(self.ktdexp)
         self.ksup[4] = self.ktdexl
+
+        if (self.template_info is not None) and not self.delayed_repl_present:
+            self.store_descriptor_lists_in_cache()
+            self.descriptors_list_subset = None
+        else:
+            self.descriptors_list_subset = subset
         
         self.descriptors_list_filled = True
         #  #]
+    def fill_descriptor_list_from_template(self):
+        #  #[ fill the descriptor lists without calling busel2
+        """
+        fill the descriptor lists using the python expansion of the
+        template, and the names and units returned by bufrex.
+        This is only done if no delayed replication is present and the
+        expansion is consistent with the bufrex result (so it is not
+        used if for example operators add associated fields).
+        Returns True if the lists have been filled.
+        """
+        if ( (not self.data_decoded) or
+             (self.template_info is None) or
+             self.delayed_repl_present or
+             (not self.py_expanded_descr_list) ):
+            return False
+
+        ktdexp = np.array([descr for descr in self.py_expanded_descr_list
+                           if descr < 100000], dtype=int)
+        ktdexl = len(ktdexp)
+        if (ktdexl != self.ksup[4]) or (ktdexl > len(self.cnames)):
+            return False
+
+        # compare the names to make sure the lists are aligned
+        names = np.char.strip(np.ascontiguousarray(
+            self.cnames[:ktdexl, :]).view('S64')[:, 0])
+        for (name, descr) in zip(names, ktdexp):
+            table_b_entry = self.bt.table_b.get(descr)
+            if ( (table_b_entry is None) or
+                 (name.decode('latin-1') != table_b_entry.name.strip()) ):
+                return False
+
+        self.ktdlst = self.py_unexp_descr_array.astype(int)
+        self.ktdlen = len(self.ktdlst)
+        self.ktdexp = ktdexp
+        self.ktdexl = ktdexl
+        self.store_descriptor_lists_in_cache()
+
+        self.descriptors_list_filled = True
+        self.descriptors_list_subset = None
+        return True
+        #  #]
     def get_descriptor_list(self):
         #  #[
         """
@@ -1955,7 +2907,7 @@ class BUFRInterfaceECMWF:
         # They will also print zeros for all not used elements of
         # these ktdlst and ktdexp arrays
 
-        self.store_fortran_stdout()
+        self.store_fortran_stdout(capture=True)
         ecmwfbufr.buprs3(self.ksec3,
                          self.ktdlst,
                          self.ktdexp,
@@ -2201,19 +3153,22 @@ class BUFRInterfaceECMWF:
         # print('DEBUG: self.cnames = ',self.cnames.shape)
         # print('DEBUG: self.cunits = ',self.cunits.shape)
         
-        self.store_fortran_stdout()
-        ecmwfbufr.buxdes(iprint,      # input
-                         self.ksec1,  # input
-                         self.ktdlst, # input
-                         self.kdata,  # input
-                         self.ktdexl, # output
-                         self.ktdexp, # output
-                         self.cnames, # output
-                         self.cunits, # output
-                         kerr)        # output
+        args = (iprint,      # input
+                self.ksec1,  # input
+                self.ktdlst, # input
+                self.kdata,  # input
+                self.ktdexl, # output
+                self.ktdexp, # output
+                self.cnames, # output
+                self.cunits, # output
+                kerr)        # output
+        self.store_fortran_stdout(capture=(iprint == 1))
+        ecmwfbufr.buxdes(*args)
         lines = self.get_fortran_stdout()
         self.display_fortran_stdout(lines)
         if (kerr != 0):
+            lines = self.rerun_with_fortran_stdout(ecmwfbufr.buxdes, args)
+            self.display_fortran_stdout(lines)
             raise EcmwfBufrLibError(self.explain_error(kerr, 'buxdes'))
 
         if self.verbose:
@@ -2338,19 +3293,22 @@ class BUFRInterfaceECMWF:
             # print('DEBUG: self.cnames = ',self.cnames.shape)
             # print('DEBUG: self.cunits = ',self.cunits.shape)
             
-            self.store_fortran_stdout()
-            ecmwfbufr.buxdes(iprint,      # input
-                             self.ksec1,  # input
-                             self.ktdlst, # input
-                             self.kdata,  # input
-                             self.ktdexl, # output
-                             self.ktdexp, # output
-                             self.cnames, # output
-                             self.cunits, # output
-                             kerr)        # output
+            args = (iprint,      # input
+                    self.ksec1,  # input
+                    self.ktdlst, # input
+                    self.kdata,  # input
+                    self.ktdexl, # output
+                    self.ktdexp, # output
+                    self.cnames, # output
+                    self.cunits, # output
+                    kerr)        # output
+            self.store_fortran_stdout(capture=(iprint == 1))
+            ecmwfbufr.buxdes(*args)
             lines = self.get_fortran_stdout()
             self.display_fortran_stdout(lines)
             if (kerr != 0):
+                lines = self.rerun_with_fortran_stdout(ecmwfbufr.buxdes, args)
+                self.display_fortran_stdout(lines)
                 raise EcmwfBufrLibError(self.explain_error(kerr, 'buxdes'))
 
             #print("DEBUG expand_descriptors_for_decoding: ",
@@ -2393,6 +3351,14 @@ class BUFRInterfaceECMWF:
         actual_nr_of_subsets = self.get_num_subsets()
         self.kvals = self.max_nr_expanded_descriptors*actual_nr_of_subsets
 
+        # bufren needs a cvals array with one row for each value,
+        # so pad the (smaller) cvals array returned by decode_data
+        if len(cvals) < len(values):
+            padded_cvals = np.zeros((len(values), cvals.shape[1]),
+                                    dtype=cvals.dtype)
+            padded_cvals[:len(cvals), :] = cvals
+            cvals = padded_cvals
+
         # copy incoming data into instance namespace
         self.values = values
         self.cvals  = cvals
@@ -2413,25 +3379,28 @@ class BUFRInterfaceECMWF:
         words = np.zeros(int(num_words), dtype=int)
 
         # call BUFREN
+        args = (self.ksec0, # input
+                self.ksec1, # input
+                self.ksec2, # input
+                self.ksec3, # input
+                self.ksec4, # input
+                self.ktdlst, # input: expanded descriptor list
+                self.kdata,  # input :list of max nr of del. replic.
+                self.ktdexl, # input: exp_descr_list_length,
+                values, # input: values to encode
+                cvals,  # input: strings to encode
+#                cval_strings,  # input: strings to encode
+                words, # output: the encoded message
+                kerr)  # output: an error flag
         self.store_fortran_stdout()
-        ecmwfbufr.bufren(self.ksec0, # input
-                         self.ksec1, # input
-                         self.ksec2, # input
-                         self.ksec3, # input
-                         self.ksec4, # input
-                         self.ktdlst, # input: expanded descriptor list
-                         self.kdata,  # input :list of max nr of del. replic.
-                         self.ktdexl, # input: exp_descr_list_length,
-                         values, # input: values to encode
-                         cvals,  # input: strings to encode
-#                         cval_strings,  # input: strings to encode
-                         words, # output: the encoded message
-                         kerr)  # output: an error flag
+        ecmwfbufr.bufren(*args)
         lines = self.get_fortran_stdout()
         self.display_fortran_stdout(lines)
         if self.verbose:
             print("bufren call finished")
         if (kerr != 0):
+            lines = self.rerun_with_fortran_stdout(ecmwfbufr.bufren, args)
+            self.display_fortran_stdout(lines)
             raise EcmwfBufrLibError(self.explain_error(kerr, 'bufren'))
 
         #for i in range(len(values)):
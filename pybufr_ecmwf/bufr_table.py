@@ -46,6 +46,11 @@ import stat
 import sys
 import glob
 import csv
+import pickle
+import hashlib
+import tempfile
+from collections import OrderedDict
+import numpy
 
 from pybufr_ecmwf.custom_exceptions import (
     ProgrammingError, EcmwfBufrTableError)
@@ -582,6 +587,17 @@ class CompositeDescriptor(Descriptor):  # [table D entry]
             self.handle_descriptors_and_handle_replication(descriptor_list))
         #  #]
 
+    def __getstate__(self):
+        #  #[ leave out the table set when pickling
+        '''
+        the table set is only needed while constructing this entry,
+        and is restored by BufrTable.load_tables_from_cache()
+        '''
+        state = self.__dict__.copy()
+        state['bufr_table_set'] = None
+        return state
+        #  #]
+
     def handle_descriptors_and_handle_replication(self, descriptor_list):
         #  #[ recursively handle replication
         '''
@@ -751,15 +767,60 @@ class FlagDefinition:
     '''
     a class to handle flag definitions as defined in table C
     '''
+    undefined_value_text = '<UNDEFINED VALUE>'
+
     def __init__(self, reference):
         self.reference = reference
         self.flag_dict = {}
+        # sorted keys and corresponding texts, used by lookup()
+        self.lookup_keys = None
+        self.lookup_texts = None
 
     def __str__(self):
         text = []
         for k in sorted(self.flag_dict):
             text.append('flag: '+str(k)+' value: '+str(self.flag_dict[k]))
         return '\n'.join('==> '+line for line in text)
+
+    def compile_lookup_arrays(self):
+        #  #[ convert the flag_dict to arrays
+        '''
+        convert the flag_dict to a sorted array of keys and
+        an array of corresponding texts, to allow fast lookups
+        '''
+        keys = sorted(self.flag_dict)
+        self.lookup_keys = numpy.array(keys, dtype=numpy.int64)
+        self.lookup_texts = numpy.array([self.flag_dict[k] for k in keys] +
+                                        [self.undefined_value_text],
+                                        dtype=object)
+        #  #]
+
+    def lookup(self, values):
+        #  #[ convert an array of values to text
+        '''
+        convert an array of (flag or code table) values to an object
+        array of the corresponding texts. Values that are not defined
+        (including missing values) result in '<UNDEFINED VALUE>'
+        '''
+        if ((self.lookup_keys is None) or
+                (len(self.lookup_keys) != len(self.flag_dict))):
+            self.compile_lookup_arrays()
+
+        values = numpy.asarray(values, dtype=numpy.float64)
+        # values outside the range of the keys cannot be defined
+        max_key = self.lookup_keys[-1] if len(self.lookup_keys) else -1
+        in_range = (values >= 0) & (values <= max_key)
+        int_values = numpy.where(in_range, values, 0).astype(numpy.int64)
+
+        index = numpy.searchsorted(self.lookup_keys, int_values)
+        index = numpy.minimum(index, len(self.lookup_keys)-1)
+        found = in_range & (len(self.lookup_keys) > 0)
+        if len(self.lookup_keys) > 0:
+            found &= (self.lookup_keys[index] == int_values)
+        # the last text is the undefined value text
+        index = numpy.where(found, index, len(self.lookup_texts)-1)
+        return self.lookup_texts[index]
+        #  #]
     #  #]
 
 
@@ -786,6 +847,26 @@ class BufrTable:
     saved_C_table = None
     saved_D_table = None
 
+    # the most recently used sets of parsed tables, keyed by the
+    # (B, C, D) table file names, least recently used first.
+    # This allows switching between tables (for example for a file
+    # holding messages from different centres) without parsing them again.
+    table_sets = OrderedDict()
+    max_num_table_sets = 8
+    table_set_stats = {'hits':0, 'misses':0, 'evictions':0}
+
+    # parsed tables are stored as pickle files in this directory,
+    # keyed by path, modification time and size of the table files,
+    # so other processes can load them without parsing the text files.
+    # (None means the default location ~/.cache/pybufr_ecmwf).
+    # Since loading a pickle file can run arbitrary code, the directory
+    # and the files must be owned by the user and not be writable
+    # by others, otherwise the cache is not used.
+    use_table_cache = True
+    table_cache_dir = None
+    # increment this if the table classes change in an incompatible way
+    table_cache_version = 1
+
     def __init__(self,
                  autolink_tablesdir="tmp_BUFR_TABLES",
                  tables_dir=None,
@@ -1133,22 +1214,27 @@ class BufrTable:
         C_tablefile = os.path.join(path, 'C'+base[1:])
         D_tablefile = os.path.join(path, 'D'+base[1:])
 
+        # the table files may be symlinks, which may point to other
+        # tables later on, so use the files they point to as key
+        table_set_key = (os.path.realpath(B_tablefile),
+                         os.path.realpath(C_tablefile),
+                         os.path.realpath(D_tablefile))
+
         reload_tables = False
         if base[0].upper() == 'B':
             #
-            if (self.__class__.currently_loaded_B_table != B_tablefile):
+            if (self.__class__.currently_loaded_B_table != table_set_key[0]):
                 reload_tables = True
         elif base[0].upper() == 'C':
-            if (self.__class__.currently_loaded_C_table != C_tablefile):
+            if (self.__class__.currently_loaded_C_table != table_set_key[1]):
                 reload_tables = True
         elif base[0].upper() == 'D':
-            if (self.__class__.currently_loaded_D_table != D_tablefile):
+            if (self.__class__.currently_loaded_D_table != table_set_key[2]):
                 reload_tables = True
         else:
             print("ERROR: don't know what table this is")
             print("(path, base) = "+str((path, base)))
             raise IOError
-
         if reload_tables:
             # first unload the previous file
             # note that unload removes all 3 files (B,C,D)
@@ -1158,7 +1244,25 @@ class BufrTable:
 
             # print('******* DEBUG: unloading tables')
             self.unload_tables()
-
+        else:
+            self.table_set_stats['hits'] += 1
+
+        if reload_tables and table_set_key in self.table_sets:
+            # these tables have been parsed before
+            self.table_set_stats['hits'] += 1
+            self.table_sets.move_to_end(table_set_key)
+            (self.table_b, self.table_c, self.table_d) = \
+                           self.table_sets[table_set_key]
+            self.__class__.saved_B_table = self.table_b
+            self.__class__.saved_C_table = self.table_c
+            self.__class__.saved_D_table = self.table_d
+        elif reload_tables and self.load_tables_from_cache(B_tablefile,
+                                                         C_tablefile,
+                                                         D_tablefile):
+            self.__class__.saved_B_table = self.table_b
+            self.__class__.saved_C_table = self.table_c
+            self.__class__.saved_D_table = self.table_d
+        elif reload_tables:
             # then load the new files
             # print('******* DEBUG: reloading table B: ',  B_tablefile)
             self.load_b_table(B_tablefile)
@@ -1182,15 +1286,194 @@ class BufrTable:
             self.load_d_table(D_tablefile)
             self.__class__.saved_D_table = self.table_d
 
+            self.save_tables_to_cache(B_tablefile, C_tablefile, D_tablefile)
+
         else:  # reuse the already loaded tables
             # print('******* DEBUG: Reusing stored tables')
             self.table_b = self.__class__.saved_B_table
             self.table_c = self.__class__.saved_C_table
             self.table_d = self.__class__.saved_D_table
 
-        self.__class__.currently_loaded_B_table = B_tablefile
-        self.__class__.currently_loaded_C_table = C_tablefile
-        self.__class__.currently_loaded_D_table = D_tablefile
+        if reload_tables and table_set_key not in self.table_sets:
+            self.add_table_set(table_set_key)
+
+        (self.__class__.currently_loaded_B_table,
+         self.__class__.currently_loaded_C_table,
+         self.__class__.currently_loaded_D_table) = table_set_key
+        #  #]
+
+    def add_table_set(self, table_set_key):
+        #  #[ store the loaded tables in the table set cache
+        """
+        add the currently loaded tables to the table_sets cache,
+        and remove the least recently used set if it is full
+        """
+        self.table_set_stats['misses'] += 1
+        self.table_sets[table_set_key] = (self.table_b, self.table_c,
+                                          self.table_d)
+        while len(self.table_sets) > max(1, self.max_num_table_sets):
+            self.table_sets.popitem(last=False)
+            self.table_set_stats['evictions'] += 1
+        #  #]
+
+    def get_table_set_stats(self):
+        #  #[ report on the use of the table set cache
+        """
+        returns a dict with the number of cached table sets (size),
+        the number of load() calls served without parsing (hits)
+        or that needed parsing (misses), and the number of evictions
+        """
+        stats = dict(self.table_set_stats)
+        stats['size'] = len(self.table_sets)
+        return stats
+        #  #]
+
+    def clear_table_sets(self):
+        #  #[ empty the table set cache
+        """
+        remove all table sets from the cache, so the next load
+        will read the tables again
+        """
+        self.unload_tables()
+        self.table_sets.clear()
+        for key in self.table_set_stats:
+            self.table_set_stats[key] = 0
+        #  #]
+
+    def get_table_cache_file(self, B_tablefile, C_tablefile, D_tablefile):
+        #  #[ name of the cache file for a set of tables
+        """
+        returns the name of the pickle file used to cache the given
+        set of tables, or None if the B or D table does not exist.
+        The name depends on the path, modification time and size of
+        each table file, so a changed table file is parsed again.
+        """
+        key = [self.table_cache_version, sys.version_info[0]]
+        for (i, tablefile) in enumerate((B_tablefile, C_tablefile,
+                                         D_tablefile)):
+            try:
+                file_stat = os.stat(tablefile)
+            except OSError:
+                if i == 1:
+                    # the C table is optional
+                    key.append(None)
+                    continue
+                return None
+            key.append((os.path.realpath(tablefile),
+                        file_stat.st_mtime, file_stat.st_size))
+
+        cache_dir = self.table_cache_dir
+        if cache_dir is None:
+            cache_home = os.environ.get('XDG_CACHE_HOME',
+                                        os.path.join(os.path.expanduser('~'),
+                                                     '.cache'))
+            cache_dir = os.path.join(cache_home, 'pybufr_ecmwf')
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(cache_dir, 'bufr_tables_'+digest+'.pickle')
+        #  #]
+
+    @staticmethod
+    def is_private_path(path):
+        #  #[ check if only the current user can change a file or dir
+        """
+        returns True if the given file or directory (not a symbolic
+        link) is owned by the current user, and is not writable by
+        the group or others.
+        """
+        if not hasattr(os, 'getuid'):
+            # ownership cannot be checked on this platform
+            return False
+        try:
+            path_stat = os.lstat(path)
+        except OSError:
+            return False
+        if stat.S_ISLNK(path_stat.st_mode):
+            return False
+        if path_stat.st_uid != os.getuid():
+            return False
+        return (path_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)) == 0
+        #  #]
+
+    def load_tables_from_cache(self, B_tablefile, C_tablefile, D_tablefile):
+        #  #[ try to get the parsed tables from the cache
+        """
+        load the tables from the cache file, if present.
+        Returns True if this succeeded.
+        """
+        if not self.use_table_cache:
+            return False
+
+        cache_file = self.get_table_cache_file(B_tablefile, C_tablefile,
+                                               D_tablefile)
+        if (cache_file is None) or not os.path.exists(cache_file):
+            return False
+
+        # never unpickle a file someone else could have written
+        if not (self.is_private_path(os.path.dirname(cache_file)) and
+                self.is_private_path(cache_file)):
+            if self.verbose:
+                print('not using unsafe table cache file: '+cache_file)
+            return False
+
+        try:
+            with open(cache_file, 'rb') as fd:
+                (version, table_b, table_c, table_d) = pickle.load(fd)
+        except Exception: # pylint: disable=broad-except
+            # a corrupt or incompatible cache file, parse the tables again
+            return False
+        if version != self.table_cache_version:
+            return False
+
+        if self.verbose:
+            print("loading tables from cache file: "+cache_file)
+
+        self.table_b = table_b
+        self.table_c = table_c
+        self.table_d = table_d
+        for descr in self.table_d.values():
+            descr.bufr_table_set = self
+        return True
+        #  #]
+
+    def save_tables_to_cache(self, B_tablefile, C_tablefile, D_tablefile):
+        #  #[ store the parsed tables in the cache
+        """
+        store the currently loaded tables in the cache file.
+        Failures are ignored since the cache is only an optimisation.
+        """
+        if not self.use_table_cache:
+            return
+
+        cache_file = self.get_table_cache_file(B_tablefile, C_tablefile,
+                                               D_tablefile)
+        if cache_file is None:
+            return
+
+        cache_dir = os.path.dirname(cache_file)
+        tmp_file = None
+        try:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir, mode=0o700)
+            if not self.is_private_path(cache_dir):
+                if self.verbose:
+                    print('not writing to unsafe table cache dir: '+
+                          cache_dir)
+                return
+            # write to a temporary file first and rename it, so other
+            # processes never see a partially written cache file
+            (fd_tmp, tmp_file) = tempfile.mkstemp(dir=cache_dir,
+                                                  suffix='.tmp')
+            with os.fdopen(fd_tmp, 'wb') as fd:
+                pickle.dump((self.table_cache_version, self.table_b,
+                             self.table_c, self.table_d), fd,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_file, cache_file)
+        except Exception as err: # pylint: disable=broad-except
+            if (tmp_file is not None) and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            if self.verbose:
+                print('could not write table cache file: '+cache_file)
+                print(str(err))
         #  #]
 
     def autolinkbufrtablefile(self, t_file):
@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+
+"""
+This file defines the NumpyBUFRDecoder class, a pure python/numpy
+alternative for decoding section 4 of a BUFR message, that can be used
+in stead of the bufrex routine of the ECMWF BUFR library.
+Only a part of the BUFR features is supported. For unsupported
+templates a NotYetImplementedError is raised, to allow the caller to
+fall back to the ECMWF library.
+"""
+
+#  #[ documentation
+#
+# Note about the use of the "#  #[" and "#  #]" comments:
+#   these are folding marks for my favorite editor, emacs, combined with its
+#   folding mode
+#   (see http://www.emacswiki.org/emacs/FoldingMode for more details)
+# Please do not remove them.
+#
+# Supported for compressed data:
+#   table B elements (numeric, code and flag tables, CCITTIA5 strings),
+#   table D sequences, fixed and delayed replication (031000, 031001,
+#   031002), and the operators 201, 202, 207 and 208.
+# Supported for uncompressed data:
+#   the same, except delayed replication. Without delayed replication
+#   each subset has the same bit layout, so the template is converted
+#   once into a table of bit offsets and widths, and all subsets are
+#   decoded with one vectorised bit gather.
+# Not supported (yet):
+#   delayed repetition, associated fields, character insertion,
+#   local descriptors, changed reference values, and all operators
+#   that use bitmaps (221 and higher).
+#
+# Copyright J. de Kloe
+# This software is licensed under the terms of the LGPLv3 Licence
+# which can be obtained from https://www.gnu.org/licenses/lgpl.html
+#
+#  #]
+#  #[ imported modules
+from __future__ import (absolute_import, division,
+                        print_function) #, unicode_literals)
+
+import numpy as np # import numerical capabilities
+
+from .bufr_table import (Short_Delayed_Descr_Repl_Factor,
+                         Delayed_Descr_Repl_Factor,
+                         Extended_Delayed_Descr_Repl_Factor)
+from .custom_exceptions import NotYetImplementedError
+#  #]
+
+MISSING_INDICATOR = 1.7e38
+
+# the largest number of bits that can be extracted
+# in one go by extract_bits()
+MAX_NUM_BITS = 57
+
+DELAYED_REPL_FACTORS = (Short_Delayed_Descr_Repl_Factor,
+                        Delayed_Descr_Repl_Factor,
+                        Extended_Delayed_Descr_Repl_Factor)
+
+# descriptors for which all bits set does not mean missing
+NEVER_MISSING = DELAYED_REPL_FACTORS + (31031,)
+
+def read_bits(data, bit_position, num_bits):
+    #  #[ read a single value
+    '''
+    read a single unsigned integer of num_bits bits, starting at
+    bit_position, from the bytes object data
+    '''
+    if num_bits == 0:
+        return 0
+    start = bit_position//8
+    end = (bit_position+num_bits+7)//8
+    value = int.from_bytes(data[start:end], 'big')
+    return (value >> (8*end-bit_position-num_bits)) & ((1 << num_bits)-1)
+    #  #]
+
+def extract_bits(data, bit_positions, num_bits):
+    #  #[ read an array of values
+    '''
+    read unsigned integers of num_bits bits, starting at each of the
+    bit positions, from the uint8 array data (which must be padded
+    with at least 8 zero bytes). num_bits may also be an array
+    with the same shape as bit_positions.
+    '''
+    byte_positions = bit_positions//8
+    words = np.zeros(bit_positions.shape, dtype=np.uint64)
+    for i in range(8):
+        words = (words << np.uint64(8)) | data[byte_positions+i]
+    words <<= (bit_positions % 8).astype(np.uint64)
+    return words >> np.asarray(64-num_bits, dtype=np.uint64)
+    #  #]
+
+class NumpyBUFRDecoder:
+    #  #[
+    """
+    a class to decode section 4 of a BUFR message using numpy.
+    After calling decode() the results are available in the same
+    layout as produced by the bufrex routine:
+    values: 1D array of length num_elements*num_subsets, with value i
+            of subset j (starting at 0) at index i+num_elements*j
+    cvals: 2D array of characters (num_strings, 80) and the values
+            of string elements contain 1000*(index+1)+length into this
+            array (index starting at 0)
+    expanded_descriptors: the expanded list of table B descriptors
+    cnames, cunits: 2D arrays of characters with the names and units
+    """
+    def __init__(self, bufr_table, verbose=False):
+        #  #[
+        self.bt = bufr_table
+        self.verbose = verbose
+        # cache of the descriptor lists for each table D sequence
+        self.sequences = {}
+        # cache of the bit layout for each uncompressed template
+        self.layouts = {}
+        self.reset()
+        #  #]
+    def reset(self):
+        #  #[ reset the decoding state
+        """ prepare for decoding a new message """
+        self.data = None
+        self.data_bytes = None
+        self.bit_position = 0
+        self.num_subsets = 0
+        self.compressed = True
+
+        # state changed by the 2xx operators
+        self.width_change = 0
+        self.scale_change = 0
+        self.increased_precision = 0
+        self.char_width = None
+
+        # the decoded elements
+        self.element_descriptors = []
+        self.element_values = []
+        self.strings = []
+
+        # the bit layout of a subset, used for uncompressed data
+        self.layout = None
+
+        self.values = None
+        self.cvals = None
+        self.expanded_descriptors = None
+        self.cnames = None
+        self.cunits = None
+        self.num_elements = 0
+        #  #]
+    def decode(self, msg_bytes, section4_start, unexp_descr_list,
+               num_subsets, compressed=True):
+        #  #[ decode section 4
+        """
+        decode section 4 of the BUFR message given as bytes
+        (or uint8 array) msg_bytes, in which section 4 starts at byte
+        section4_start, for the given unexpanded descriptor list.
+        """
+        self.reset()
+
+        msg_bytes = np.asarray(msg_bytes, dtype=np.uint8)
+        section4_size = (65536*int(msg_bytes[section4_start]) +
+                         256*int(msg_bytes[section4_start+1]) +
+                         int(msg_bytes[section4_start+2]))
+        data = msg_bytes[section4_start+4:section4_start+section4_size]
+
+        # pad the data to allow extract_bits() to read 8 bytes everywhere
+        self.data = np.zeros(len(data)+8, dtype=np.uint8)
+        self.data[:len(data)] = data
+        self.data_bytes = self.data.tobytes()
+        self.num_bits = 8*len(data)
+        self.num_subsets = num_subsets
+        self.compressed = compressed
+
+        descr_list = [int(d) for d in unexp_descr_list]
+        if compressed:
+            self.decode_descriptors(descr_list)
+            self.collect_results()
+        else:
+            self.decode_uncompressed(self.get_layout(descr_list))
+        #  #]
+    def get_layout(self, descr_list):
+        #  #[ bit layout of a subset of uncompressed data
+        """
+        returns the bit layout of one subset for the given unexpanded
+        descriptor list, as a dict of arrays with for each element the
+        descriptor, bit offset, width, scale, reference value, and flags
+        for strings and for elements that cannot be missing
+        """
+        key = tuple(descr_list)
+        if key not in self.layouts:
+            # walk the template without reading any data
+            self.layout = []
+            self.bit_position = 0
+            self.decode_descriptors(descr_list)
+            layout = {}
+            for i, name in enumerate(['reference', 'offset', 'width',
+                                      'scale', 'ref_value', 'is_string',
+                                      'never_missing']):
+                layout[name] = np.array([item[i] for item in self.layout],
+                                        dtype=np.int64)
+            layout['subset_bits'] = self.bit_position
+            self.layouts[key] = layout
+            self.layout = None
+            self.bit_position = 0
+        return self.layouts[key]
+        #  #]
+    def add_to_layout(self, reference, width, scale=0, ref_value=0,
+                      is_string=False):
+        #  #[ add an element to the bit layout
+        """ store an element of an uncompressed subset """
+        if width < 1 or (not is_string and width > MAX_NUM_BITS):
+            raise NotYetImplementedError('data width %i for ' % width +
+                                         'descriptor %6.6i' % reference)
+        if is_string and (width % 8) != 0:
+            raise NotYetImplementedError('string width is not a multiple '+
+                                         'of 8 bits')
+        never_missing = (reference in NEVER_MISSING) or (width == 1)
+        self.layout.append((reference, self.bit_position, width, scale,
+                            ref_value, is_string, never_missing))
+        self.bit_position += width
+        #  #]
+    def decode_uncompressed(self, layout):
+        #  #[ decode all subsets of uncompressed data
+        """ decode all subsets using the bit layout of one subset """
+        subset_bits = layout['subset_bits']
+        if self.num_subsets*subset_bits > self.num_bits:
+            raise NotYetImplementedError('section 4 is shorter than '+
+                                         'the template requires')
+
+        num_elements = len(layout['reference'])
+        subset_starts = subset_bits*np.arange(self.num_subsets,
+                                              dtype=np.int64)
+        values = np.zeros((self.num_subsets, num_elements),
+                          dtype=np.float64)
+
+        # numerical values (including code and flag tables)
+        numeric = np.where(layout['is_string'] == 0)[0]
+        if len(numeric) > 0:
+            widths = np.broadcast_to(layout['width'][numeric],
+                                     (self.num_subsets, len(numeric)))
+            positions = (subset_starts[:, np.newaxis] +
+                         layout['offset'][numeric][np.newaxis, :])
+            raw_values = extract_bits(self.data, positions, widths)
+            all_bits_set = ((np.uint64(1) << widths.astype(np.uint64)) -
+                            np.uint64(1))
+            missing = ((raw_values == all_bits_set) &
+                       (layout['never_missing'][numeric] == 0))
+            scale_factors = 10.0**(-layout['scale'][numeric])
+            numeric_values = ((raw_values.astype(np.float64) +
+                               layout['ref_value'][numeric]) *
+                              scale_factors)
+            numeric_values[missing] = MISSING_INDICATOR
+            values[:, numeric] = numeric_values
+
+        # strings, stored in the same way bufrex does
+        for i in np.where(layout['is_string'] != 0)[0]:
+            num_chars = layout['width'][i]//8
+            positions = (subset_starts[:, np.newaxis] + layout['offset'][i] +
+                         8*np.arange(num_chars, dtype=np.int64))
+            chars = extract_bits(self.data, positions, 8).astype(np.uint8)
+            first_index = len(self.strings)
+            self.strings.extend(row.tobytes() for row in chars)
+            values[:, i] = (1000.*(first_index+1+
+                                   np.arange(self.num_subsets)) + num_chars)
+
+        self.element_descriptors = layout['reference'].tolist()
+        self.bit_position = self.num_subsets*subset_bits
+        self.collect_results(values)
+        #  #]
+    def get_sequence(self, reference):
+        #  #[ list of descriptors in a table D sequence
+        """ returns the list of descriptors of a table D entry """
+        if reference not in self.sequences:
+            try:
+                descr_list = self.bt.table_d[reference].descriptor_list
+            except KeyError:
+                raise NotYetImplementedError('descriptor %6.6i not found' %
+                                             reference)
+            self.sequences[reference] = [d.reference for d in descr_list]
+        return self.sequences[reference]
+        #  #]
+    def decode_descriptors(self, descr_list):
+        #  #[ walk over a list of descriptors
+        """ decode the data for the given list of descriptors """
+        i = 0
+        while i < len(descr_list):
+            reference = descr_list[i]
+            f_val = reference//100000
+            x_val = (reference//1000) % 100
+            y_val = reference % 1000
+            if f_val == 0:
+                self.decode_element(reference)
+                i += 1
+            elif f_val == 1:
+                if y_val == 0:
+                    # delayed replication, the next descriptor
+                    # holds the replication factor
+                    if not self.compressed:
+                        raise NotYetImplementedError(
+                            'delayed replication is only supported '+
+                            'for compressed data')
+                    factor_reference = descr_list[i+1]
+                    if factor_reference not in DELAYED_REPL_FACTORS:
+                        raise NotYetImplementedError(
+                            'delayed repetition is not supported')
+                    factor = self.decode_element(factor_reference)
+                    group = descr_list[i+2:i+2+x_val]
+                    i += 2+x_val
+                else:
+                    factor = y_val
+                    group = descr_list[i+1:i+1+x_val]
+                    i += 1+x_val
+                for _ in range(factor):
+                    self.decode_descriptors(group)
+            elif f_val == 2:
+                self.apply_operator(x_val, y_val)
+                i += 1
+            elif f_val == 3:
+                self.decode_descriptors(self.get_sequence(reference))
+                i += 1
+            else:
+                raise NotYetImplementedError('unknown descriptor %6.6i' %
+                                             reference)
+        #  #]
+    def apply_operator(self, x_val, y_val):
+        #  #[ handle the supported 2xx operators
+        """ apply a data description operator """
+        if x_val == 1:
+            self.width_change = (y_val-128 if y_val else 0)
+        elif x_val == 2:
+            self.scale_change = (y_val-128 if y_val else 0)
+        elif x_val == 7:
+            self.increased_precision = y_val
+        elif x_val == 8:
+            self.char_width = (8*y_val if y_val else None)
+        else:
+            raise NotYetImplementedError('operator 2%2.2i%3.3i is not '%
+                                         (x_val, y_val)+'supported')
+        #  #]
+    def read(self, num_bits):
+        #  #[ read a single value at the current position
+        """ read a value of num_bits bits and advance the position """
+        if self.bit_position+num_bits > self.num_bits:
+            raise NotYetImplementedError('section 4 is shorter than '+
+                                         'the template requires')
+        value = read_bits(self.data_bytes, self.bit_position, num_bits)
+        self.bit_position += num_bits
+        return value
+        #  #]
+    def read_increments(self, num_bits, num_values):
+        #  #[ read an array of values at the current position
+        """ read num_values values of num_bits bits """
+        if num_bits > MAX_NUM_BITS:
+            raise NotYetImplementedError('data width too large')
+        if self.bit_position+num_bits*num_values > self.num_bits:
+            raise NotYetImplementedError('section 4 is shorter than '+
+                                         'the template requires')
+        positions = (self.bit_position +
+                     num_bits*np.arange(num_values, dtype=np.int64))
+        self.bit_position += num_bits*num_values
+        return extract_bits(self.data, positions, num_bits)
+        #  #]
+    def decode_element(self, reference):
+        #  #[ decode a table B element for all subsets
+        """
+        decode a table B element for all subsets, and return
+        its value in the first subset (used for replication factors)
+        """
+        try:
+            descr = self.bt.table_b[reference]
+        except KeyError:
+            raise NotYetImplementedError('descriptor %6.6i not found' %
+                                         reference)
+
+        if descr.unit == 'CCITTIA5':
+            if self.layout is not None:
+                self.add_to_layout(reference,
+                                   self.char_width or descr.data_width,
+                                   is_string=True)
+            else:
+                self.decode_string_element(reference, descr)
+            return None
+
+        is_code_or_flag = ('TABLE' in descr.unit)
+        width = descr.data_width
+        scale = descr.unit_scale
+        ref_value = descr.unit_reference
+        if not is_code_or_flag:
+            width += self.width_change
+            scale += self.scale_change
+            if self.increased_precision:
+                scale += self.increased_precision
+                ref_value *= 10**self.increased_precision
+                width += (10*self.increased_precision+2)//3
+
+        if self.layout is not None:
+            # uncompressed data: only store the bit layout
+            self.add_to_layout(reference, width, scale, ref_value)
+            return None
+
+        # compressed data: reference value, increment width, increments
+        r0_value = self.read(width)
+        nbinc = self.read(6)
+        if nbinc == 0:
+            raw_values = np.full(self.num_subsets, r0_value, dtype=np.float64)
+            missing = np.full(self.num_subsets,
+                              r0_value == (1 << width)-1, dtype=bool)
+        else:
+            increments = self.read_increments(nbinc, self.num_subsets)
+            raw_values = r0_value + increments.astype(np.float64)
+            missing = (increments == (1 << nbinc)-1)
+
+        if reference in NEVER_MISSING or width == 1:
+            missing[:] = False
+
+        values = (raw_values + ref_value) * 10.0**(-scale)
+        values[missing] = MISSING_INDICATOR
+
+        self.element_descriptors.append(reference)
+        self.element_values.append(values)
+
+        if reference in DELAYED_REPL_FACTORS:
+            if nbinc != 0:
+                raise NotYetImplementedError('delayed replication factor '+
+                                             'differs between subsets')
+            return int(r0_value)
+        return values[0]
+        #  #]
+    def decode_string_element(self, reference, descr):
+        #  #[ decode a CCITTIA5 element for all subsets
+        """ decode a string element for all subsets """
+        width = self.char_width or descr.data_width
+        r0_value = self.read(width)
+        nbinc = self.read(6)
+        if nbinc == 0:
+            # all subsets have the same string
+            num_chars = width//8
+            string = r0_value.to_bytes(num_chars, 'big')
+            strings = [string]*self.num_subsets
+        else:
+            # nbinc gives the number of characters for each subset
+            num_chars = nbinc
+            chars = self.read_increments(8, num_chars*self.num_subsets)
+            chars = chars.astype(np.uint8).reshape(self.num_subsets,
+                                                   num_chars)
+            strings = [row.tobytes() for row in chars]
+
+        # store the strings and refer to them in the same way bufrex does
+        first_index = len(self.strings)
+        self.strings.extend(strings)
+        values = (1000.*(first_index+1+np.arange(self.num_subsets)) +
+                  num_chars)
+
+        self.element_descriptors.append(reference)
+        self.element_values.append(values)
+        #  #]
+    def collect_results(self, values=None):
+        #  #[ store the results in the bufrex layout
+        """
+        combine the decoded elements into the values, cvals,
+        cnames, cunits and expanded_descriptors arrays
+        (values may be given as a 2D array with the subsets
+        along the first axis, elements along the second)
+        """
+        self.num_elements = len(self.element_descriptors)
+        self.expanded_descriptors = np.array(self.element_descriptors,
+                                             dtype=int)
+        if values is not None:
+            self.values = values.reshape(-1)
+        elif self.num_elements > 0:
+            # subsets along the first axis, elements along the second
+            self.values = np.stack(self.element_values, axis=1).reshape(-1)
+        else:
+            self.values = np.zeros(0, dtype=np.float64)
+
+        self.cvals = np.zeros((max(1, len(self.strings)), 80), dtype='S1')
+        if self.strings:
+            records = self.cvals.view('S80')[:, 0]
+            records[:len(self.strings)] = [s[:80] for s in self.strings]
+
+        self.cnames = np.zeros((max(1, self.num_elements), 64), dtype='S1')
+        self.cunits = np.zeros((max(1, self.num_elements), 24), dtype='S1')
+        names = self.cnames.view('S64')[:, 0]
+        units = self.cunits.view('S24')[:, 0]
+        for i, reference in enumerate(self.element_descriptors):
+            # pad with spaces, like the fortran library does
+            descr = self.bt.table_b[reference]
+            names[i] = descr.name.encode('latin-1', 'replace')[:64].ljust(64)
+            units[i] = descr.unit.encode('latin-1', 'replace')[:24].ljust(24)
+        #  #]
+    #  #]
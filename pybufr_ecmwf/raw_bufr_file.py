@@ -30,8 +30,12 @@ from __future__ import (absolute_import, division,
                         print_function) #, unicode_literals)
 
 import os          # operating system functions
+import mmap        # memory mapped file access
 import numpy as np # import numerical capabilities
 import struct      # allow converting c datatypes and structs
+import hashlib     # to generate unique index file names
+from array import array # compact storage of the message index
+from .custom_exceptions import IncorrectUsageError
 #  #]
 
 class RawBUFRFile:
@@ -41,9 +45,58 @@ class RawBUFRFile:
     to file. Is is intended to replace the pbio routines from the ECMWF
     library which for some obscure reason cannot be interfaced
     easily to python using the f2py tool.
+
+    If use_mmap is set, a file opened for reading is memory mapped
+    in stead of read into memory, and the file is scanned lazily:
+    the index of messages is only extended up to the message that
+    is requested, so memory use does not grow with the file size
+    and the first message is available immediately.
+
+    If use_index_file is set, the message index of a file opened for
+    reading is stored in a sidecar index file (next to the BUFR file,
+    or in index_dir if given), and reused when the same (unmodified)
+    file is opened again, so no rescan of the file is needed.
+
+    For writing, write_buffer_size sets the buffer size of the output
+    file (as for the buffering argument of the builtin open function),
+    flush_every (if set) flushes the output after every flush_every
+    messages, and trim_padding removes the zero padding bytes behind
+    the end of each message before writing it.
     """
+    # nr of integers stored per message in the compact index
+    # used in mmap mode: start, end, 6 section sizes
+    # and 6 section start locations
+    index_record_length = 14
+    # layout of the sidecar index files
+    index_file_version = 1
+    index_file_extension = '.pybufr_index.npz'
+    index_dtype = np.dtype([('start', '<i8'), ('end', '<i8'),
+                            ('section_sizes', '<i8', (6,)),
+                            ('section_start_locations', '<i8', (6,)),
+                            ('edition', '<i2'),
+                            ('data_category', '<i2'),
+                            ('num_subsets', '<i4')])
+    # layout of the header information returned by headers()
+    header_dtype = np.dtype([('offset', '<i8'), ('length', '<i8'),
+                             ('edition', '<i2'),
+                             ('centre', '<i4'), ('subcentre', '<i4'),
+                             ('data_category', '<i2'),
+                             ('data_subcategory', '<i2'),
+                             ('master_table', '<i2'),
+                             ('master_table_version', '<i2'),
+                             ('local_table_version', '<i2'),
+                             ('datetime', 'datetime64[s]'),
+                             ('num_subsets', '<i4'),
+                             ('compressed', '?'),
+                             ('template_hash', '<u8')])
     def __init__(self, verbose = False,
-                 warn_about_bufr_size = True):
+                 warn_about_bufr_size = True,
+                 use_mmap = False,
+                 use_index_file = False,
+                 index_dir = None,
+                 write_buffer_size = -1,
+                 flush_every = None,
+                 trim_padding = False):
         #  #[
         self.bufr_fd  = None
         self.filename = None
@@ -55,6 +108,24 @@ class RawBUFRFile:
         self.last_used_msg = 0
         self.verbose = verbose
         self.warn_about_bufr_size = warn_about_bufr_size
+        self.use_mmap = use_mmap
+        # compact message index used in mmap mode, filled incrementally
+        # by scan_next_msg(), and the position where scanning continues
+        self.msg_index = array('q')
+        self.scan_position = 0
+        self.scan_completed = False
+        # the index read from the sidecar index file, if any
+        self.loaded_index = None
+        self.use_index_file = use_index_file
+        self.index_dir = index_dir
+        self.write_buffer_size = write_buffer_size
+        self.flush_every = flush_every
+        self.trim_padding = trim_padding
+        self.msgs_written_since_flush = 0
+        # state used when appending to an existing file
+        self.existing_filesize = 0
+        self.existing_index = None
+        self.count_pending = False
         #  #]
     def print_properties(self, prefix = "BUFRFile"):
         #  #[
@@ -65,6 +136,8 @@ class RawBUFRFile:
         # different addresses each time, and is not so very interesting
         # to print, so leave it out for now
         #print(prefix+": bufr_fd  = ", self.bufr_fd)
+        if self.count_pending:
+            self.count_existing_msgs()
         print(prefix+": filename = "+self.filename)
         print(prefix+": filemode = "+self.filemode)
         print(prefix+": filesize = "+str(self.filesize))
@@ -109,29 +182,29 @@ class RawBUFRFile:
             # file, in which case one will be generated, so test for
             # this condition
             if (os.path.exists(filename)):
-                # in this case, try to find out the amount of BUFR messages
-                # already present in this file, by temporary opening
-                # it in reading mode
-                tmp_bf = RawBUFRFile()
-                tmp_bf.open(filename, 'rb')
-                #tmp_bf.print_properties(prefix = "tmp_bf (opened for reading)")
-                count = tmp_bf.get_num_bufr_msgs()
-                tmp_bf.close()
-                del(tmp_bf)
-
-                # then store the found number for later use
-                self.nr_of_bufr_messages = count
+                # in this case the amount of BUFR messages already
+                # present in this file is needed. If a valid sidecar
+                # index file is present it can be taken from there.
+                # Otherwise counting is postponed until the number is
+                # actually requested (see count_existing_msgs), so
+                # appending does not require scanning the whole file.
                 self.filesize = os.path.getsize(filename)
-
-                if ((count == 0) and (self.filesize>0)):
-                    print("WARNING: appending to non-zero file, but could")
-                    print("not find any BUFR messages in it. Maybe you are")
-                    print("appending to a non-BUFR file??")
+                self.existing_filesize = self.filesize
+                if self.use_index_file:
+                    self.existing_index = self.read_index_file()
+                if self.existing_index is not None:
+                    self.nr_of_bufr_messages = len(self.existing_index)
+                else:
+                    self.count_pending = True
             else:
                 self.filesize = 0            
 
         try:
-            self.bufr_fd = open(filename, mode)
+            if (mode == 'rb'):
+                self.bufr_fd = open(filename, mode)
+            else:
+                self.bufr_fd = open(filename, mode,
+                                    buffering=self.write_buffer_size)
         except:
             if (not silent):
                 print("ERROR in BUFRFile.open():")
@@ -139,9 +212,22 @@ class RawBUFRFile:
                       self.filemode, " failed")
             raise IOError
 
+        if ((mode == 'rb') and self.use_index_file and
+            (not self.use_mmap) and self.load_index_file()):
+            # the messages are read on demand by get_raw_bufr_msg,
+            # so there is no need to read the whole file
+            return
+
         if (mode == 'rb'):
             try:
-                self.data = self.bufr_fd.read()
+                if not self.use_mmap:
+                    self.data = self.bufr_fd.read()
+                elif self.filesize > 0:
+                    self.data = mmap.mmap(self.bufr_fd.fileno(), 0,
+                                          access=mmap.ACCESS_READ)
+                else:
+                    # an empty file cannot be memory mapped
+                    self.data = b''
             except:
                 if (not silent):
                     print("ERROR in BUFRFile.open():")
@@ -149,8 +235,21 @@ class RawBUFRFile:
                           " with mode: ", self.filemode, " failed")
                 raise IOError
 
-            # split in separate BUFR messages
-            self.split()
+            if self.use_index_file and self.load_index_file():
+                # no need to scan the file
+                pass
+            elif not self.use_mmap:
+                # split in separate BUFR messages
+                self.split()
+                if self.use_index_file:
+                    self.save_index_file()
+            elif self.use_index_file:
+                # an index file can only be written once all
+                # messages have been located
+                self.scan_up_to_msg()
+                self.save_index_file()
+            # in mmap mode without index file the messages are
+            # located on demand by scan_next_msg()
 
         #  #]
     def close(self):
@@ -158,10 +257,27 @@ class RawBUFRFile:
         """
         close a BUFR file
         """
+        # release the memory map, if any
+        if isinstance(self.data, mmap.mmap):
+            try:
+                self.data.close()
+            except BufferError:
+                # arrays returned to the user may still refer to
+                # the mapped memory; in that case the map is released
+                # when the last of these arrays is deleted
+                pass
         # close the file
         self.bufr_fd.close()
-        # then erase all settings
-        self.__init__()
+        if ((self.filemode == 'ab') and
+            (self.existing_index is not None)):
+            self.update_index_file_after_append()
+        # then erase all settings (but remember the reading mode)
+        self.__init__(use_mmap=self.use_mmap,
+                      use_index_file=self.use_index_file,
+                      index_dir=self.index_dir,
+                      write_buffer_size=self.write_buffer_size,
+                      flush_every=self.flush_every,
+                      trim_padding=self.trim_padding)
         #  #]
     def get_expected_msg_size(self, start_location):
         #  #[
@@ -214,7 +330,7 @@ class RawBUFRFile:
             edition_number = ord(raw_edition_number)
             if (self.verbose):
                 print('edition_number = ', edition_number)
-        except IndexError:
+        except (IndexError, TypeError):
              # 0 signals this is not a valid BUFR msg, might be a false
              # start BUFR string, or a corrupted or truncated file
             return (0, section_sizes, section_start_locations)
@@ -411,7 +527,7 @@ class RawBUFRFile:
                     print('SKIPPING this message...')
                     return (0, section_sizes, section_start_locations)
                 
-        except IndexError:
+        except (IndexError, TypeError):
             # 0 signals this is not a valid BUFR msg, might be a false
             # start BUFR string, or a corrupted or truncated file
             return (0, section_sizes, section_start_locations)
@@ -463,78 +579,480 @@ class RawBUFRFile:
             self.nr_of_bufr_messages = 0
             return
 
-        # note: this very simpple search algorithm might accidently
-        # find the string "7777" in the middle of the data of a BUFR message.
-        # To check on this, make sure the distance between the end of a
-        # message and the start of a message if either 0 or 2 bytes
-        # (this may happen if the file is padded with zeros to contain
-        #  a multiple of 4 bytes)
-        # Do the same check on the end of the file.
+        # note: a simple search for the string "7777" might accidently
+        # find it in the middle of the data of a BUFR message.
+        # Therefore only the "BUFR" start strings are searched for.
+        # For each of these the expected message size is extracted
+        # from the section headers, and the "7777" end string is
+        # verified at the expected end location. If it matches, the
+        # scanning continues behind the end of this message, so message
+        # bodies are never scanned. If it does not match, we found a false
+        # start marker or a corrupt BUFR message, and the search
+        # continues just behind this start marker.
 
-        txt_start  = b'BUFR'
-        txt_end    = b'7777'
-        list_of_start_locations = []
-        list_of_end_locations   = []
+        self.list_of_bufr_pointers = []
 
-        # try to find the start strings
         search_pos = 0
-        file_end_reached = False
-        while not file_end_reached:
-            start_pos = self.data.find(txt_start, search_pos)
-            if (start_pos == -1):
-                file_end_reached = True
-            else:
-                list_of_start_locations.append(start_pos)
-                search_pos = start_pos + 4
+        while True:
+            result = self.find_next_msg(search_pos)
+            if result is None:
+                break
 
-        # try to find the end strings
-        search_pos = 0
-        file_end_reached = False
-        while not file_end_reached:
-            end_pos = self.data.find(txt_end, search_pos)
-            if (end_pos == -1):
-                file_end_reached = True
-            else:
-                list_of_end_locations.append(end_pos)
-                search_pos = end_pos + 4
+            # the end location points to the end of the four sevens
+            # (in slice notation, so the bufr msg data
+            # can be adressed as data[start_pos:end_pos])
+            self.list_of_bufr_pointers.append(result)
+            search_pos = result[1]
 
-        self.list_of_bufr_pointers = []
+        # count howmany we found
+        self.nr_of_bufr_messages = len(self.list_of_bufr_pointers)
+
+        if (self.verbose):
+            print("list_of_start_locations = ",
+                  [p[0] for p in self.list_of_bufr_pointers])
+            print("list_of_end_locations   = ",
+                  [p[1]-4 for p in self.list_of_bufr_pointers])
+
+        #  #]
+    def find_next_msg(self, search_pos):
+        #  #[
+        """
+        find the first valid BUFR message starting at or after
+        search_pos. Returns a tuple (start, end, section_sizes,
+        section_start_locations) or None if no more messages are found.
+        """
+        txt_start  = b'BUFR'
+        txt_end    = b'7777'
+        while True:
+            start_location = self.data.find(txt_start, search_pos)
+            if (start_location == -1):
+                return None
 
-        # try each BUFR message; extract its length and see if
-        # it matches an end location. If not we found a false start
-        # marker or a corrupt BUFR message. If it matches, assume
-        # the BUFR message is valid and add it to the list
-        for start_location in list_of_start_locations:
             expected_msg_size, section_sizes, section_start_locations = \
                                self.get_expected_msg_size(start_location)
             if (self.verbose):
                 print('expected_msg_size = ', expected_msg_size)
-            expected_msg_end_location = start_location + expected_msg_size - 4
-            if expected_msg_end_location in list_of_end_locations:
-                if (self.verbose):
-                    print('message seems alright, adding it to the list')
-                # point to the end of the four sevens
-                # (in slice notation, so the bufr msg data
-                # can be adressed as data[start_pos:end_pos])
-                # and store it
-                self.list_of_bufr_pointers.append((start_location,
-                                                   expected_msg_end_location+4,
-                                                   section_sizes,
-                                                   section_start_locations))
-        
+            if expected_msg_size > 0:
+                end_location = start_location + expected_msg_size
+                if self.data[end_location-4:end_location] == txt_end:
+                    if (self.verbose):
+                        print('message seems alright, adding it to the list')
+                    return (start_location, end_location,
+                            section_sizes, section_start_locations)
 
-        # count howmany we found
-        self.nr_of_bufr_messages = len(self.list_of_bufr_pointers)
+            # false start marker or corrupt message,
+            # so continue searching just behind it
+            search_pos = start_location + 4
+        #  #]
+    def scan_next_msg(self):
+        #  #[
+        """
+        extend the compact message index used in mmap mode with
+        the next BUFR message in the file.
+        Returns False if the end of the file has been reached.
+        """
+        if self.scan_completed:
+            return False
 
-        if (self.verbose):
-            print("list_of_start_locations = ", list_of_start_locations)
-            print("list_of_end_locations   = ", list_of_end_locations)
+        result = self.find_next_msg(self.scan_position)
+        if result is None:
+            self.scan_completed = True
+            self.scan_position = len(self.data)
+            return False
+
+        (start_location, end_location,
+         section_sizes, section_start_locations) = result
+        self.msg_index.append(start_location)
+        self.msg_index.append(end_location)
+        self.msg_index.extend(section_sizes)
+        self.msg_index.extend(section_start_locations)
+        self.nr_of_bufr_messages = self.nr_of_bufr_messages + 1
+        # jump past the message just found
+        self.scan_position = end_location
+        return True
+        #  #]
+    def scan_up_to_msg(self, msg_nr=None):
+        #  #[
+        """
+        make sure the compact message index holds at least msg_nr
+        messages (or all messages if msg_nr is None)
+        """
+        while ((msg_nr is None) or (self.nr_of_bufr_messages < msg_nr)):
+            if not self.scan_next_msg():
+                break
+        #  #]
+    def get_bufr_pointers(self, msg_nr):
+        #  #[
+        """
+        return the tuple (start, end, section_sizes, section_start_locations)
+        for the BUFR message with given msg_nr (start counting at 1)
+        """
+        if not self.use_mmap:
+            return self.list_of_bufr_pointers[msg_nr-1]
+
+        n = self.index_record_length
+        record = self.msg_index[(msg_nr-1)*n:msg_nr*n]
+        return (record[0], record[1], list(record[2:8]), list(record[8:14]))
+        #  #]
+    def read_file_data(self):
+        #  #[
+        """
+        read the whole file into memory, if this was not done by open()
+        because the message index was taken from the index file
+        """
+        if self.data is None:
+            self.bufr_fd.seek(0)
+            self.data = self.bufr_fd.read()
+        #  #]
+    def get_msg_header_info(self, start_location, section_start_locations):
+        #  #[
+        """
+        extract some basic properties of the BUFR message starting at
+        start_location directly from the header bytes of sections 0, 1
+        and 3, without calling the ECMWF library.
+        Returns a dict with the edition, data_category and num_subsets.
+        """
+        self.read_file_data()
+        start_section1 = start_location + section_start_locations[1]
+        start_section3 = start_location + section_start_locations[3]
+
+        # see get_expected_msg_size() for the location of the edition
+        edition = ord(self.data[start_location+7:start_location+8])
+
+        # the data category is in byte 9 of section 1 for editions
+        # up to 3, and in byte 11 for edition 4
+        if edition < 4:
+            category_byte = 9
+        else:
+            category_byte = 11
+        data_category = ord(self.data[start_section1+category_byte-1:
+                                      start_section1+category_byte])
+
+        # bytes 5 and 6 of section 3 hold the number of subsets
+        num_subsets = struct.unpack(">1H",
+                                    self.data[start_section3+5-1:
+                                              start_section3+6])[0]
+
+        return {'edition':edition,
+                'data_category':data_category,
+                'num_subsets':num_subsets}
+        #  #]
+    def headers(self):
+        #  #[
+        """
+        extract the header information of all BUFR messages in the
+        current file from sections 0, 1 and 3, without calling the
+        ECMWF library, and return it as numpy structured array (with
+        dtype header_dtype) to allow selecting messages with numpy
+        operations, for example:
+        hdr = rbf.headers()
+        msg_nrs = np.where(hdr['data_category'] == 12)[0] + 1
+        The datetime is NaT if the date in section 1 is not valid,
+        and template_hash is taken from a sha1 hash of the unexpanded
+        descriptor list, so messages with the same template have the
+        same hash.
+        """
+        self.read_file_data()
+
+        # collect the message pointers in a 2D array
+        if self.use_mmap:
+            self.scan_up_to_msg()
+            pointers = np.array(self.msg_index, dtype='<i8')
+        else:
+            pointers = np.array([[start, end] + list(section_sizes) +
+                                 list(section_start_locations)
+                                 for (start, end, section_sizes,
+                                      section_start_locations)
+                                 in self.list_of_bufr_pointers], dtype='<i8')
+        pointers = pointers.reshape(-1, self.index_record_length)
+
+        data = np.frombuffer(self.data, dtype=np.uint8)
+        def get_int(positions, num_bytes=1):
+            ''' convert big endian bytes to integers '''
+            values = np.zeros(len(positions), dtype='<i8')
+            for i in range(num_bytes):
+                values = 256*values + data[positions+i]
+            return values
+
+        start = pointers[:, 0]
+        start_section1 = start + pointers[:, 8+1]
+        start_section3 = start + pointers[:, 8+3]
+
+        # see get_expected_msg_size() for the location of the edition
+        edition = get_int(start+7)
+
+        # the layout of section 1 depends on the edition
+        # (editions 0 and 1 have the same layout as edition 2,
+        #  except that byte 4 is not used for the master table)
+        ed4 = (edition >= 4)
+        ed3 = (edition == 3)
+        def get_sec1_int(pos_ed4, pos_ed3, num_bytes_ed4=1):
+            ''' get section 1 items that are present in all editions '''
+            return np.where(ed4, get_int(start_section1+pos_ed4-1,
+                                         num_bytes_ed4),
+                            get_int(start_section1+pos_ed3-1))
+
+        headers = np.zeros(len(pointers), dtype=self.header_dtype)
+        headers['offset'] = start
+        headers['length'] = pointers[:, 1] - start
+        headers['edition'] = edition
+        headers['master_table'] = np.where(edition >= 2,
+                                           get_int(start_section1+3), 0)
+        headers['centre'] = np.where(ed3, get_int(start_section1+5),
+                                     get_int(start_section1+4, 2))
+        headers['subcentre'] = np.where(ed4, get_int(start_section1+6, 2),
+                                        np.where(ed3,
+                                                 get_int(start_section1+4),
+                                                 0))
+        headers['data_category'] = get_sec1_int(11, 9)
+        headers['data_subcategory'] = get_sec1_int(13, 10)
+        headers['master_table_version'] = get_sec1_int(14, 11)
+        headers['local_table_version'] = get_sec1_int(15, 12)
+
+        # before edition 4 only the year of the century is stored
+        year = get_sec1_int(16, 13, num_bytes_ed4=2)
+        year = np.where(ed4, year, np.where(year > 50, 1900, 2000) + year)
+        month = get_sec1_int(18, 14)
+        day = get_sec1_int(19, 15)
+        hour = get_sec1_int(20, 16)
+        minute = get_sec1_int(21, 17)
+        second = np.where(ed4, get_int(start_section1+21), 0)
+        valid = ((month >= 1) & (month <= 12) & (day >= 1) & (day <= 31) &
+                 (hour <= 24) & (minute <= 59) & (second <= 60))
+        datetime = ((np.clip(year, 1, 9999)-1970).astype('datetime64[Y]') +
+                    (np.clip(month, 1, 12)-1).astype('timedelta64[M]')).\
+                    astype('datetime64[s]')
+        datetime += ((day-1)*86400 + hour*3600 + minute*60 +
+                     second).astype('timedelta64[s]')
+        headers['datetime'] = np.where(valid, datetime, np.datetime64('NaT'))
+
+        # bytes 5 and 6 of section 3 hold the number of subsets,
+        # byte 7 holds the observed and compressed flags
+        headers['num_subsets'] = get_int(start_section3+4, 2)
+        headers['compressed'] = (get_int(start_section3+6) & 64) > 0
+
+        # the descriptors use 2 bytes each, starting at byte 8
+        num_descr_bytes = 2*((pointers[:, 2+3]-7)//2)
+        for (i, (pos, num_bytes)) in enumerate(zip(start_section3.tolist(),
+                                                   num_descr_bytes.tolist())):
+            digest = hashlib.sha1(self.data[pos+7:pos+7+num_bytes]).digest()
+            headers['template_hash'][i] = struct.unpack('>Q', digest[:8])[0]
+
+        return headers
+        #  #]
+    def get_index(self):
+        #  #[
+        """
+        return the message index of the current file as numpy
+        structured array (with dtype index_dtype).
+        """
+        if self.data is None:
+            # the file was not read, since the index file was used
+            return self.loaded_index.copy()
+
+        if self.use_mmap:
+            self.scan_up_to_msg()
+
+        index = np.zeros(self.nr_of_bufr_messages, dtype=self.index_dtype)
+        for i in range(self.nr_of_bufr_messages):
+            (start_location, end_location,
+             section_sizes, section_start_locations) = \
+                 self.get_bufr_pointers(i+1)
+            info = self.get_msg_header_info(start_location,
+                                            section_start_locations)
+            index[i] = (start_location, end_location,
+                        section_sizes, section_start_locations,
+                        info['edition'], info['data_category'],
+                        info['num_subsets'])
+        return index
+        #  #]
+    def set_index(self, index):
+        #  #[
+        """
+        fill the message index from a numpy structured array
+        as returned by get_index()
+        """
+        self.list_of_bufr_pointers = []
+        self.msg_index = array('q')
+        for record in index:
+            if self.use_mmap:
+                self.msg_index.append(int(record['start']))
+                self.msg_index.append(int(record['end']))
+                self.msg_index.extend(record['section_sizes'].tolist())
+                self.msg_index.extend(
+                    record['section_start_locations'].tolist())
+            else:
+                self.list_of_bufr_pointers.append(
+                    (int(record['start']), int(record['end']),
+                     record['section_sizes'].tolist(),
+                     record['section_start_locations'].tolist()))
+
+        self.nr_of_bufr_messages = len(index)
+        if self.use_mmap:
+            self.scan_completed = True
+            self.scan_position = len(self.data)
+        #  #]
+    def get_index_filename(self):
+        #  #[
+        """
+        construct the name of the sidecar index file for the current file
+        """
+        if self.index_dir is None:
+            return self.filename + self.index_file_extension
+
+        # use a hash of the full path to allow files with the same
+        # name in different directories to share the same index_dir
+        abs_filename = os.path.abspath(self.filename)
+        path_hash = hashlib.md5(abs_filename.encode('utf-8')).hexdigest()
+        return os.path.join(self.index_dir,
+                            os.path.basename(self.filename)+'.'+
+                            path_hash[:16]+self.index_file_extension)
+        #  #]
+    def get_file_fingerprint(self):
+        #  #[
+        """
+        return the version, size and modification time, used to verify
+        that a sidecar index file still matches the current file
+        """
+        stat_result = os.stat(self.filename)
+        return np.array([self.index_file_version,
+                         stat_result.st_size,
+                         stat_result.st_mtime_ns], dtype='<i8')
+        #  #]
+    def load_index_file(self):
+        #  #[
+        """
+        try to load the message index from the sidecar index file.
+        Returns True on success, and False if no valid index file
+        was found (missing, outdated or corrupt).
+        """
+        index = self.read_index_file()
+        if index is None:
+            return False
+
+        self.set_index(index)
+        self.loaded_index = index
+        return True
+        #  #]
+    def read_index_file(self):
+        #  #[
+        """
+        read the message index from the sidecar index file.
+        Returns None if no valid index file was found
+        (missing, outdated or corrupt).
+        """
+        index_filename = self.get_index_filename()
+        if not os.path.exists(index_filename):
+            return None
+
+        try:
+            with np.load(index_filename, allow_pickle=False) as npz:
+                fingerprint = npz['fingerprint']
+                index = npz['index']
+        except (IOError, OSError, ValueError, KeyError):
+            if self.verbose:
+                print('ignoring unreadable index file: ', index_filename)
+            return None
+
+        if ((index.dtype != self.index_dtype) or
+            (fingerprint.tolist() != self.get_file_fingerprint().tolist())):
+            if self.verbose:
+                print('ignoring outdated index file: ', index_filename)
+            return None
+
+        return index
+        #  #]
+    def save_index_file(self, index=None):
+        #  #[
+        """
+        write the message index (by default the index of the current
+        file as returned by get_index) to the sidecar index file.
+        Failing to write it (for example for a file in a read-only
+        archive directory) is not considered to be an error.
+        """
+        if index is None:
+            index = self.get_index()
+
+        index_filename = self.get_index_filename()
+        try:
+            if self.index_dir is not None:
+                if not os.path.exists(self.index_dir):
+                    os.makedirs(self.index_dir)
+            # write to a temporary file first and then rename it, to
+            # prevent other processes from reading a half written index
+            tmp_filename = index_filename+'.'+str(os.getpid())+'.tmp'
+            with open(tmp_filename, 'wb') as fd:
+                np.savez(fd, fingerprint=self.get_file_fingerprint(),
+                         index=index)
+            os.rename(tmp_filename, index_filename)
+        except (IOError, OSError):
+            if self.verbose:
+                print('could not write index file: ', index_filename)
+        #  #]
+    def scan_existing_msgs(self):
+        #  #[
+        """
+        open the file being appended to in memory mapped mode, and
+        return this RawBUFRFile instance after scanning the messages
+        that were present when the file was opened for appending
+        """
+        # make sure all messages written so far are in the file
+        if not self.bufr_fd.closed:
+            self.bufr_fd.flush()
+
+        tmp_bf = RawBUFRFile(use_mmap=True,
+                             warn_about_bufr_size=self.warn_about_bufr_size)
+        tmp_bf.open(self.filename, 'rb')
+        while tmp_bf.scan_next_msg():
+            if tmp_bf.scan_position > self.existing_filesize:
+                # ignore messages appended by this instance
+                tmp_bf.nr_of_bufr_messages = tmp_bf.nr_of_bufr_messages-1
+                del tmp_bf.msg_index[-self.index_record_length:]
+                break
+        return tmp_bf
+        #  #]
+    def count_existing_msgs(self):
+        #  #[
+        """
+        add the number of messages that were already present in the
+        file being appended to, to the number of messages written
+        """
+        tmp_bf = self.scan_existing_msgs()
+        count = tmp_bf.nr_of_bufr_messages
+        tmp_bf.close()
+        del(tmp_bf)
 
+        self.nr_of_bufr_messages = self.nr_of_bufr_messages + count
+        self.count_pending = False
+
+        if ((count == 0) and (self.existing_filesize>0)):
+            print("WARNING: appending to non-zero file, but could")
+            print("not find any BUFR messages in it. Maybe you are")
+            print("appending to a non-BUFR file??")
+        #  #]
+    def update_index_file_after_append(self):
+        #  #[
+        """
+        extend the sidecar index file of a file that was appended to,
+        scanning only the part of the file that was added
+        """
+        tmp_bf = RawBUFRFile(use_mmap=True, index_dir=self.index_dir,
+                             warn_about_bufr_size=self.warn_about_bufr_size)
+        tmp_bf.open(self.filename, 'rb')
+        # start scanning behind the messages already in the index
+        tmp_bf.scan_position = self.existing_filesize
+        new_index = tmp_bf.get_index()
+        tmp_bf.save_index_file(np.concatenate([self.existing_index,
+                                               new_index]))
+        tmp_bf.close()
+        del(tmp_bf)
         #  #]
     def get_num_bufr_msgs(self):
         #  #[
         """
         request the number of BUFR messages in the current file
+        (in mmap mode without index file this scans the rest of
+        the file, so its cost is O(file size))
         """
         if (self.bufr_fd == None):
             print("ERROR: a bufr file first needs to be opened")
@@ -542,6 +1060,12 @@ class RawBUFRFile:
             print("number of BUFR messages in a file ..")
             raise IOError
 
+        if self.use_mmap and (self.filemode == 'rb'):
+            # counting requires the whole index to be available
+            self.scan_up_to_msg()
+        if self.count_pending:
+            self.count_existing_msgs()
+
         return self.nr_of_bufr_messages
         #  #]
     def get_raw_bufr_msg(self, msg_nr):
@@ -556,6 +1080,9 @@ class RawBUFRFile:
             print("using BUFRFile.open() before you can use the raw data ..")
             raise IOError
 
+        if self.use_mmap:
+            self.scan_up_to_msg(msg_nr)
+
         # sanity test
         if (msg_nr>self.nr_of_bufr_messages):
             print("WARNING: non-existing BUFR message: ", msg_nr)
@@ -571,14 +1098,13 @@ class RawBUFRFile:
 
         self.last_used_msg = msg_nr
         (start_index, end_index, section_sizes, section_start_locations) = \
-                      self.list_of_bufr_pointers[msg_nr-1]
+                      self.get_bufr_pointers(msg_nr)
 
         size_bytes = (end_index-start_index)
 
         # +3 because we have to round upwards to make sure all
         # bytes fit into the array of words (otherwise the last
-        # few might be truncated from the data, which will crash
-        # the struct.unpack() call below)
+        # few might be truncated from the data)
         size_words = (size_bytes+3)//4
         padding_bytes = size_words*4-size_bytes
 
@@ -590,35 +1116,41 @@ class RawBUFRFile:
             
         # make sure we take the padding bytes along
         end_index = end_index+padding_bytes
-        
-        raw_data_bytes = self.data[start_index:end_index]
-
-        # make sure the raw datastream is padded with zero bytes
-        # to a multiple of 4 bytes. The ECMWF software may crash
-        # if this is not the case ...
-        nbytes = len(raw_data_bytes)
-        nbytes_rounded = 4*(nbytes//4)
-        if nbytes != nbytes_rounded:
-            # print('padding problem found! fixing it ...')
-            # print('nbytes = ',nbytes)
-            # print('nbytes_rounded = ',nbytes_rounded)
-            num_zeros_to_add = nbytes_rounded+4-nbytes
-            # print('num_zeros_to_add = ',num_zeros_to_add)
-            str_to_add = b''.join(b'\x00' for i in range(num_zeros_to_add))
-            raw_data_bytes = raw_data_bytes + str_to_add
-
-        if (self.verbose):
-            print("len(raw_data_bytes) = ", len(raw_data_bytes))
 
         # assume little endian for now when converting
         # raw bytes/characters to integers and vice-versa
-        dataformat = "<"+str(size_words)+"i"
-        try:
-            words = np.array(struct.unpack(dataformat, raw_data_bytes))
-        except:
-            # 0 signals this is not a valid BUFR msg, might be a false
-            # start BUFR string, or a corrupted or truncated file
-            return (0, section_sizes, section_start_locations)
+        if self.data is None:
+            # read only this message from file (zero padded, like the
+            # last message in a file read into memory)
+            self.bufr_fd.seek(start_index)
+            raw_data_bytes = bytearray(size_words*4)
+            num_bytes = self.bufr_fd.readinto(raw_data_bytes)
+            if num_bytes < size_bytes:
+                print("ERROR: could not read BUFR message: ", msg_nr)
+                raise IOError
+            words = np.frombuffer(raw_data_bytes, dtype='<i4')
+        elif end_index <= len(self.data):
+            # the words can be used directly from the file data
+            # (or from the memory map) without copying them
+            words = np.frombuffer(self.data, dtype='<i4',
+                                  count=size_words, offset=start_index)
+            if not words.flags.aligned:
+                # messages following a GTS header may start at any
+                # byte, so copy these to be safe for the fortran code
+                words = words.copy()
+        else:
+            # make sure the raw datastream is padded with zero bytes
+            # to a multiple of 4 bytes. The ECMWF software may crash
+            # if this is not the case ...
+            # This only happens for the last message in a file, so only
+            # this one needs to be copied.
+            raw_data_bytes = bytearray(size_words*4)
+            raw_data_bytes[:len(self.data)-start_index] = \
+                           self.data[start_index:end_index]
+            words = np.frombuffer(raw_data_bytes, dtype='<i4')
+
+        if (self.verbose):
+            print("len(raw_data_bytes) = ", words.nbytes)
 
         return (words, section_sizes, section_start_locations)
         #  #]
@@ -629,6 +1161,9 @@ class RawBUFRFile:
         This routine uses the internal instance variable last_used_msg
         to store the index of the last read BUFR message.
         """
+        if self.use_mmap and (self.last_used_msg == self.nr_of_bufr_messages):
+            self.scan_next_msg()
+
         if (self.last_used_msg == self.nr_of_bufr_messages):
             raise EOFError
         
@@ -641,9 +1176,8 @@ class RawBUFRFile:
         """
         # input data should be an array of words!
         size_words = len(words)
-        size_bytes = size_words*4
         if (self.verbose):
-            print("size_bytes = ", size_bytes)
+            print("size_bytes = ", size_words*4)
             print("size_words = ", size_words)
 
         # convert the words to bytes in a string and write them to file
@@ -653,29 +1187,289 @@ class RawBUFRFile:
         # Answer: yes this really is needed! If the words are just written
         # as such, python converts them to long integers and writes
         # 8 bytes for each word in stead of 4 !!!!!
-        # activate the next 2 lines to test this:
-        #self.bufr_fd.write(words)
-        #return
+        # So convert the whole array to 4 byte integers in one go.
         
         # assume little endian for now when converting
         # raw bytes/characters to integers and vice-versa
-        dataformat = "<i"
-        for (i, word) in enumerate(words):
-            data = struct.pack(dataformat, word)
-            self.bufr_fd.write(data)
-
-            if i == 0:
-                if (self.verbose):
-                    print("word = ", word)
-                    print('data = ', data)
-                    print('data[:4] = ', data[:4])
-                    print('data[:4] = ', ';'.join(str(data[j])
-                                                  for j in range(4)
-                                                  if data[j].isalnum()))
-                # safety check
-                assert(data[:4] == b'BUFR')
+        data = np.asarray(words).astype('<i4').tobytes()
+
+        if (self.verbose):
+            print('data[:4] = ', data[:4])
+
+        # safety check
+        assert(data[:4] == b'BUFR')
+
+        if self.trim_padding:
+            data = data[:self.get_msg_size_from_bytes(data)]
+
+        self.bufr_fd.write(data)
 
         self.nr_of_bufr_messages = self.nr_of_bufr_messages + 1
-        self.filesize = self.filesize + size_bytes
+        self.filesize = self.filesize + len(data)
+
+        if self.flush_every is not None:
+            self.msgs_written_since_flush = self.msgs_written_since_flush + 1
+            if self.msgs_written_since_flush >= self.flush_every:
+                self.flush()
+        #  #]
+    def get_msg_size_from_bytes(self, data):
+        #  #[
+        """
+        return the actual size of the BUFR message stored in data,
+        i.e. without the padding bytes needed to fill the last word
+        """
+        edition_number = ord(data[8-1:8])
+        if edition_number > 1:
+            # bytes 5 to 7 hold the total length of the message
+            msg_size = struct.unpack(">1i", b'\x00'+data[5-1:7])[0]
+        else:
+            # editions 0 and 1 do not store the total length,
+            # so look for the end of the message in stead
+            msg_size = data.rfind(b'7777')+4
+
+        if ((msg_size < 8) or (msg_size > len(data)) or
+            (data[msg_size-4:msg_size] != b'7777')):
+            # could not determine the size, so do not trim
+            if (self.verbose):
+                print('WARNING: could not determine the message size, '+
+                      'so the padding bytes are not removed')
+            return len(data)
+
+        return msg_size
+        #  #]
+    def flush(self):
+        #  #[
+        """
+        flush all buffered BUFR messages to the file
+        """
+        self.bufr_fd.flush()
+        self.msgs_written_since_flush = 0
+        #  #]
+    #  #]
+
+class RawBUFRStream(RawBUFRFile):
+    #  #[
+    """
+    a class to read the binary BUFR messages from a stream that does not
+    allow seeking, like stdin (use sys.stdin.buffer), a pipe, or a socket
+    (use socket.makefile('rb')). The stream is read in chunks of at most
+    chunk_size bytes, and only the data of the current message is kept
+    in memory. Any junk in between the messages (like GTS headers) is
+    skipped in the same way as for the RawBUFRFile class.
+    Only sequential access using get_next_raw_bufr_msg() is possible.
+    """
+    def __init__(self, stream, chunk_size=65536,
+                 verbose=False, warn_about_bufr_size=True):
+        #  #[
+        RawBUFRFile.__init__(self, verbose=verbose,
+                             warn_about_bufr_size=warn_about_bufr_size)
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.filename = '<stream>'
+        self.filemode = 'rb'
+        # the bytes read from the stream that have not yet been
+        # returned as (part of) a BUFR message
+        self.data = bytearray()
+        self.end_of_stream = False
+
+        # prefer read1() if available, to prevent blocking until
+        # a full chunk has arrived on a slow pipe or socket
+        if hasattr(stream, 'read1'):
+            self.read_function = stream.read1
+        else:
+            self.read_function = stream.read
+        #  #]
+    def close(self):
+        #  #[
+        """
+        release the buffered data. The stream itself is not closed,
+        since it is owned by the caller.
+        """
+        self.stream = None
+        self.data = bytearray()
+        self.end_of_stream = True
+        #  #]
+    def not_supported(self, method_name):
+        #  #[
+        """
+        raise an error for the random access and writing methods
+        of RawBUFRFile, which cannot be used on a stream
+        """
+        errtxt = (method_name+'() is not supported on a stream, '+
+                  'only sequential access using get_next_raw_bufr_msg() '+
+                  'or raw_messages() is possible')
+        raise IncorrectUsageError(errtxt)
+        #  #]
+    def open(self, *args, **kwargs):
+        #  #[
+        self.not_supported('open')
+        #  #]
+    def split(self, *args, **kwargs):
+        #  #[
+        self.not_supported('split')
+        #  #]
+    def scan_up_to_msg(self, *args, **kwargs):
+        #  #[
+        self.not_supported('scan_up_to_msg')
+        #  #]
+    def get_bufr_pointers(self, *args, **kwargs):
+        #  #[
+        self.not_supported('get_bufr_pointers')
+        #  #]
+    def read_file_data(self, *args, **kwargs):
+        #  #[
+        self.not_supported('read_file_data')
+        #  #]
+    def headers(self, *args, **kwargs):
+        #  #[
+        self.not_supported('headers')
+        #  #]
+    def get_index(self, *args, **kwargs):
+        #  #[
+        self.not_supported('get_index')
+        #  #]
+    def set_index(self, *args, **kwargs):
+        #  #[
+        self.not_supported('set_index')
+        #  #]
+    def load_index_file(self, *args, **kwargs):
+        #  #[
+        self.not_supported('load_index_file')
+        #  #]
+    def save_index_file(self, *args, **kwargs):
+        #  #[
+        self.not_supported('save_index_file')
+        #  #]
+    def get_num_bufr_msgs(self, *args, **kwargs):
+        #  #[
+        self.not_supported('get_num_bufr_msgs')
+        #  #]
+    def get_raw_bufr_msg(self, *args, **kwargs):
+        #  #[
+        self.not_supported('get_raw_bufr_msg')
+        #  #]
+    def write_raw_bufr_msg(self, *args, **kwargs):
+        #  #[
+        self.not_supported('write_raw_bufr_msg')
+        #  #]
+    def read_chunk(self):
+        #  #[
+        """
+        append the next chunk of the stream to the buffered data.
+        Returns False if the end of the stream has been reached.
+        """
+        if self.end_of_stream:
+            return False
+
+        chunk = self.read_function(self.chunk_size)
+        if not chunk:
+            self.end_of_stream = True
+            return False
+
+        self.data.extend(chunk)
+        return True
+        #  #]
+    def get_bytes_needed(self):
+        #  #[
+        """
+        return the nr of bytes needed to verify the candidate message
+        at the start of the buffered data. For editions 0 and 1 the
+        message size is not stored in section 0, so this number grows
+        while more of the section headers become available.
+        """
+        if len(self.data) < 8:
+            return 8
+
+        edition_number = self.data[8-1]
+        if edition_number > 1:
+            # bytes 5 to 7 hold the total length of the message
+            return max(8, struct.unpack(">1i",
+                                        b'\x00'+bytes(self.data[5-1:7]))[0])
+
+        # for editions 0 and 1 walk through the sections
+        # (see get_expected_msg_size() for the details)
+        start_section1 = 4
+        # byte 8 of section 1 is needed for the section 2 presence flag
+        if len(self.data) < start_section1+8:
+            return start_section1+8
+        section_start = start_section1
+        sections_to_skip = [1, 3, 4]
+        if self.data[start_section1+8-1] > 0:
+            sections_to_skip = [1, 2, 3, 4]
+        for section in sections_to_skip:
+            if len(self.data) < section_start+3:
+                return section_start+3
+            section_start = section_start + struct.unpack(
+                ">1i", b'\x00'+bytes(self.data[section_start:
+                                               section_start+3]))[0]
+        # add section 5
+        return section_start+4
+        #  #]
+    def get_next_raw_bufr_msg(self):
+        #  #[
+        """
+        get the raw data for the next BUFR message in the stream.
+        Raises EOFError at the end of the stream.
+        """
+        txt_start = b'BUFR'
+        txt_end = b'7777'
+        while True:
+            start_location = self.data.find(txt_start)
+            if start_location == -1:
+                # keep the last 3 bytes, since these might hold
+                # the first part of the next start marker
+                del self.data[:max(0, len(self.data)-3)]
+                if not self.read_chunk():
+                    raise EOFError
+                continue
+
+            # discard anything in front of the start marker
+            del self.data[:start_location]
+
+            # make sure the candidate message is completely available
+            bytes_needed = self.get_bytes_needed()
+            while len(self.data) < bytes_needed:
+                if not self.read_chunk():
+                    break
+                bytes_needed = self.get_bytes_needed()
+
+            if len(self.data) >= bytes_needed:
+                (msg_size, section_sizes, section_start_locations) = \
+                           self.get_expected_msg_size(0)
+                if ((msg_size > 0) and
+                    (self.data[msg_size-4:msg_size] == txt_end)):
+                    break
+
+            # false start marker, corrupt or truncated message,
+            # so continue searching just behind the start marker
+            if (self.verbose):
+                print('skipping invalid BUFR message in stream')
+            del self.data[:4]
+
+        # copy the message to a zero padded array of words
+        # and remove it from the buffered data
+        size_words = (msg_size+3)//4
+        raw_data_bytes = bytearray(size_words*4)
+        raw_data_bytes[:msg_size] = self.data[:msg_size]
+        del self.data[:msg_size]
+        words = np.frombuffer(raw_data_bytes, dtype='<i4')
+
+        self.nr_of_bufr_messages = self.nr_of_bufr_messages + 1
+        self.last_used_msg = self.nr_of_bufr_messages
+
+        return (words, section_sizes, section_start_locations)
+        #  #]
+    def raw_messages(self):
+        #  #[
+        """
+        iterate over the raw BUFR messages in the stream, yielding the
+        same (words, section_sizes, section_start_locations) tuples as
+        returned by get_next_raw_bufr_msg()
+        """
+        while True:
+            try:
+                yield self.get_next_raw_bufr_msg()
+            except EOFError:
+                return
         #  #]
     #  #]
@@ -3,6 +3,7 @@
 import os         # operating system functions
 import sys        # operating system functions
 import unittest   # import the unittest functionality
+import numpy as np # import numerical capabilities
 from .shared_setup import (call_cmd_and_verify_output,
                            TESTDATADIR, EXAMPLE_PROGRAMS_DIR)
 
@@ -86,3 +87,155 @@ def test_run_decoding_example_message_iter_AEOLUS(setup):
     success = call_cmd_and_verify_output(cmd, testname)
     assert success
     #  #]
+
+def decode_file(input_bufr_file, **kwargs):
+    #  #[
+    """
+    decode all messages in a file with the given BUFRReader settings
+    and return the results of decoded_messages() as list
+    """
+    from pybufr_ecmwf.bufr import BUFRReader
+
+    with BUFRReader(input_bufr_file, **kwargs) as bufr:
+        return list(bufr.decoded_messages())
+    #  #]
+
+def assert_same_results(results, expected_results, rtol=None):
+    #  #[
+    """
+    check that two lists of results of decoded_messages() contain the
+    same data, names and units for each message (if rtol is given the
+    data only needs to be equal within this relative tolerance)
+    """
+    assert len(results) == len(expected_results)
+    for (msg_index, decoded_data), (exp_msg_index, exp_decoded_data) in \
+            zip(results, expected_results):
+        assert msg_index == exp_msg_index
+        assert len(decoded_data) == len(exp_decoded_data)
+        for (data, names, units), (exp_data, exp_names, exp_units) in \
+                zip(decoded_data, exp_decoded_data):
+            assert data.shape == exp_data.shape
+            if rtol is None:
+                assert (data == exp_data).all()
+            else:
+                assert np.allclose(data, exp_data, rtol=rtol)
+            assert names == exp_names
+            assert units == exp_units
+    #  #]
+
+def test_parallel_decoding_AEOLUS(setup):
+    #  #[
+    """
+    test that decoding with worker processes gives the same
+    results as sequential decoding
+    """
+    from pybufr_ecmwf.bufr import BUFRReader
+
+    sequential_results = decode_file(testinputfileAEOLUS)
+    with BUFRReader(testinputfileAEOLUS) as bufr:
+        assert len(sequential_results) == bufr.get_num_bufr_msgs()
+
+    assert_same_results(decode_file(testinputfileAEOLUS, workers=2),
+                        sequential_results)
+    with BUFRReader(testinputfileAEOLUS, workers=2) as bufr:
+        unordered_results = sorted(bufr.decoded_messages(ordered=False),
+                                   key=lambda result: result[0])
+    assert_same_results(unordered_results, sequential_results)
+    #  #]
+
+def test_template_cache_AEOLUS(setup):
+    #  #[
+    """
+    test that decoding with a filled template cache gives the same
+    results as decoding with an empty cache
+    """
+    from pybufr_ecmwf.bufr_interface_ecmwf import BUFRInterfaceECMWF
+
+    BUFRInterfaceECMWF.template_cache.clear()
+    first_results = decode_file(testinputfileAEOLUS)
+    assert len(BUFRInterfaceECMWF.template_cache) > 0
+
+    assert_same_results(decode_file(testinputfileAEOLUS), first_results)
+    #  #]
+
+def test_reuse_buffers_AEOLUS(setup):
+    #  #[
+    """
+    test that decoding with reused buffers gives the same
+    results as decoding with new arrays for each message
+    """
+    from pybufr_ecmwf.bufr import BUFRReader
+
+    with BUFRReader(testinputfileAEOLUS, reuse_buffers=True) as bufr:
+        results = list(bufr.decoded_messages())
+        assert bufr.buffer_arena.get_size_bytes() > 0
+
+    assert_same_results(results, decode_file(testinputfileAEOLUS))
+    #  #]
+
+def test_numpy_decoder_ERS(setup):
+    #  #[
+    """
+    test that the numpy decoder gives the same results as
+    the bufrex routine for compressed data
+    """
+    from pybufr_ecmwf.bufr import BUFRReader
+
+    with BUFRReader(testinputfileERS, decoder='numpy') as bufr:
+        results = list(bufr.decoded_messages())
+        assert bufr.msg._bufr_obj.decoded_with_numpy
+
+    assert_same_results(results, decode_file(testinputfileERS),
+                        rtol=1.e-10)
+    #  #]
+
+def test_private_tables_dir_AEOLUS(setup):
+    #  #[
+    """
+    test decoding with a private directory for the symlinks
+    to the BUFR tables, which should be removed by close()
+    """
+    from pybufr_ecmwf.bufr import BUFRReader
+    from pybufr_ecmwf.bufr_interface_ecmwf import BUFRInterfaceECMWF
+
+    with BUFRReader(testinputfileAEOLUS, private_tables_dir=True) as bufr:
+        tables_link_dir = bufr.tables_link_dir
+        results = list(bufr.decoded_messages())
+        assert len(os.listdir(tables_link_dir)) > 0
+    assert not os.path.exists(tables_link_dir)
+
+    # the caches should not refer to the removed dir anymore
+    assert not [key for key in BUFRInterfaceECMWF.table_setup_cache
+                if key[-1] == tables_link_dir]
+    assert not [link for link in BUFRInterfaceECMWF.current_table_links
+                if os.path.dirname(link) == tables_link_dir]
+
+    assert_same_results(results, decode_file(testinputfileAEOLUS))
+    #  #]
+
+def test_lazy_decoding_GOME(setup):
+    #  #[
+    """
+    test that the data section is only decoded when needed, and
+    that the python decoding of sections 0 upto 3 gives the same
+    result as the bufrex routine
+    """
+    from pybufr_ecmwf.bufr import BUFRReader
+
+    with BUFRReader(testinputfileGOME) as bufr:
+        for msg in bufr:
+            bufr_obj = msg._bufr_obj
+            assert not msg.data_decoded
+            assert msg.get_unexp_descr_list()
+            headers = [bufr_obj.ksec0.copy(), bufr_obj.ksec1[:18].copy(),
+                       bufr_obj.ksec3.copy()]
+            num_subsets = msg.get_num_subsets()
+            assert not msg.data_decoded
+
+            data = msg.get_values_as_2d_array()
+            assert msg.data_decoded
+            assert data.shape[0] == num_subsets
+            assert (headers[0] == bufr_obj.ksec0).all()
+            assert (headers[1] == bufr_obj.ksec1[:18]).all()
+            assert (headers[2] == bufr_obj.ksec3).all()
+    #  #]
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+import os         # operating system functions
+from pybufr_ecmwf.bufr_table import BufrTable
+
+"""
+tests to check the BufrTable class
+(these only use pure python code, so do not need the setup fixture)
+"""
+# common settings for the following tests
+alt_tables_dir = os.path.join('pybufr_ecmwf', 'alt_bufr_tables')
+b_table_file = os.path.join(alt_tables_dir, 'B0000000000098015001.TXT')
+c_table_file = os.path.join(alt_tables_dir, 'C0000000000098015001.TXT')
+d_table_file = os.path.join(alt_tables_dir, 'D0000000000098015001.TXT')
+
+def load_tables(cache_dir):
+    #  #[
+    """ load the tables, using the given cache dir """
+    bt = BufrTable(verbose=False, report_warnings=False)
+    bt.clear_table_sets()
+    bt.table_cache_dir = str(cache_dir)
+    bt.load(b_table_file)
+    bt.load(d_table_file)
+    return bt
+    #  #]
+
+def test_table_cache(tmp_path, capsys):
+    #  #[
+    """
+    check that loading the tables a second time uses the cache file
+    and gives the same tables
+    """
+    bt_parsed = load_tables(tmp_path)
+    cache_files = os.listdir(str(tmp_path))
+    assert len(cache_files) == 1
+    capsys.readouterr()
+
+    bt_cached = load_tables(tmp_path)
+    assert bt_cached.table_b is not bt_parsed.table_b
+    assert sorted(bt_cached.table_b) == sorted(bt_parsed.table_b)
+    assert sorted(bt_cached.table_c) == sorted(bt_parsed.table_c)
+    assert sorted(bt_cached.table_d) == sorted(bt_parsed.table_d)
+    for ref in (1007, 5001, 12101):
+        assert str(bt_cached.table_b[ref]) == str(bt_parsed.table_b[ref])
+    for ref, descr in bt_cached.table_d.items():
+        assert descr.bufr_table_set is bt_cached
+        assert ([d.reference for d in descr.descriptor_list] ==
+                [d.reference for d in bt_parsed.table_d[ref].descriptor_list])
+
+    # parsing the tables prints warnings about them, using the cache not
+    assert capsys.readouterr().out == ''
+    #  #]
+
+def test_table_cache_permissions(tmp_path, capsys):
+    #  #[
+    """
+    check that a cache file that others can write to is not loaded
+    """
+    cache_dir = tmp_path / 'cache'
+    load_tables(cache_dir)
+    assert oct(os.stat(str(cache_dir)).st_mode & 0o777) == oct(0o700)
+    cache_file = os.path.join(str(cache_dir), os.listdir(str(cache_dir))[0])
+    os.chmod(cache_file, 0o666)
+    capsys.readouterr()
+
+    bt = BufrTable(verbose=True, report_warnings=False)
+    bt.clear_table_sets()
+    bt.table_cache_dir = str(cache_dir)
+    assert not bt.load_tables_from_cache(b_table_file, c_table_file,
+                                          d_table_file)
+    assert 'unsafe table cache file' in capsys.readouterr().out
+
+    os.chmod(cache_file, 0o600)
+    assert bt.load_tables_from_cache(b_table_file, c_table_file,
+                                          d_table_file)
+    bt.clear_table_sets()
+    #  #]
+
+def test_table_set_lru(tmp_path):
+    #  #[
+    """
+    check that switching between table sets does not parse
+    the tables again, and that the number of sets is bounded
+    """
+    # make 3 different table sets by copying the files
+    table_dirs = []
+    for i in range(3):
+        table_dir = tmp_path / ('tables%i' % i)
+        table_dir.mkdir()
+        for table_file in (b_table_file, d_table_file):
+            with open(table_file, 'rb') as fd_in:
+                target = table_dir / os.path.basename(table_file)
+                target.write_bytes(fd_in.read())
+        table_dirs.append(table_dir)
+
+    bt = load_tables(tmp_path / 'cache')
+    bt.use_table_cache = False
+    bt.max_num_table_sets = 2
+    try:
+        tables = []
+        for table_dir in table_dirs[:2]:
+            bt.load(str(table_dir / os.path.basename(b_table_file)))
+            bt.load(str(table_dir / os.path.basename(d_table_file)))
+            tables.append(bt.table_b)
+        stats = bt.get_table_set_stats()
+        assert stats['size'] == 2
+        misses = stats['misses']
+        evictions = stats['evictions']
+
+        # switching back is only a lookup
+        bt.load(str(table_dirs[0] / os.path.basename(b_table_file)))
+        assert bt.table_b is tables[0]
+        assert bt.get_table_set_stats()['misses'] == misses
+
+        # a third set removes the least recently used one
+        bt.load(str(table_dirs[2] / os.path.basename(b_table_file)))
+        stats = bt.get_table_set_stats()
+        assert stats['size'] == 2
+        assert stats['evictions'] == evictions+1
+        assert (str(table_dirs[1] / os.path.basename(b_table_file))
+                not in [key[0] for key in bt.table_sets])
+    finally:
+        del bt.use_table_cache
+        del bt.max_num_table_sets
+        bt.clear_table_sets()
+    #  #]
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+import os         # operating system functions
+import numpy as np # import numerical capabilities
+import pytest
+from pybufr_ecmwf.raw_bufr_file import RawBUFRFile
+from pybufr_ecmwf.bufr_table import BufrTable
+from pybufr_ecmwf.numpy_decoder import (NumpyBUFRDecoder, MISSING_INDICATOR,
+                                        extract_bits, read_bits)
+from pybufr_ecmwf.custom_exceptions import NotYetImplementedError
+from .shared_setup import TESTDATADIR
+
+"""
+tests to check the NumpyBUFRDecoder class
+(these only use pure python code, so do not need the setup fixture)
+"""
+# common settings for the following tests
+testinputfile = os.path.join(TESTDATADIR, 'Testfile.BUFR')
+alt_tables_dir = os.path.join('pybufr_ecmwf', 'alt_bufr_tables')
+
+def load_alt_tables():
+    #  #[
+    """ load the WMO tables version 15 shipped with this module """
+    bt = BufrTable(verbose=False)
+    bt.load(os.path.join(alt_tables_dir, 'B0000000000098015001.TXT'))
+    bt.load(os.path.join(alt_tables_dir, 'D0000000000098015001.TXT'))
+    return bt
+    #  #]
+
+def read_first_msg(input_bufr_file):
+    #  #[
+    """
+    return the bytes, start of section 4, unexpanded descriptors
+    and number of subsets of the first message in the file
+    """
+    rbf = RawBUFRFile()
+    rbf.open(input_bufr_file, 'rb')
+    (words, section_sizes, section_start_locations) = \
+            rbf.get_next_raw_bufr_msg()
+    rbf.close()
+    msg_bytes = words.astype('<i4').view(np.uint8)
+    start3 = section_start_locations[3]
+    num_subsets = 256*int(msg_bytes[start3+4]) + int(msg_bytes[start3+5])
+    descr_bytes = msg_bytes[start3+7:start3+section_sizes[3]].astype(int)
+    num_descr = len(descr_bytes)//2
+    fx_val = descr_bytes[0:2*num_descr:2]
+    y_val = descr_bytes[1:2*num_descr:2]
+    descriptors = (100000*(fx_val >> 6) + 1000*(fx_val & 63) + y_val)
+    return (msg_bytes, section_start_locations[4],
+            descriptors[descriptors > 0], num_subsets)
+    #  #]
+
+def test_read_bits():
+    #  #[
+    """ check reading single values and arrays of values """
+    data = np.zeros(16, dtype=np.uint8)
+    data[:4] = [0b10110011, 0b01010101, 0b11110000, 0b00001111]
+    assert read_bits(data.tobytes(), 0, 3) == 0b101
+    assert read_bits(data.tobytes(), 4, 12) == 0b001101010101
+    assert read_bits(data.tobytes(), 5, 0) == 0
+    positions = np.array([0, 4, 9], dtype=np.int64)
+    assert extract_bits(data, positions, 5).tolist() == \
+           [0b10110, 0b00110, 0b10101]
+    #  #]
+
+def test_decode_compressed_ERS():
+    #  #[
+    """
+    check the decoded values of a compressed ERS message
+    against the values printed by bufr_to_ascii.py
+    (see CheckBufr.test_run_decode_example1_csv.expected_stdout)
+    """
+    (msg_bytes, start4, descriptors, num_subsets) = \
+            read_first_msg(testinputfile)
+    decoder = NumpyBUFRDecoder(load_alt_tables())
+    decoder.decode(msg_bytes, start4, descriptors, num_subsets)
+
+    assert num_subsets == 361
+    assert decoder.num_elements == 44
+    values = decoder.values.reshape(num_subsets, decoder.num_elements)
+    assert np.allclose(values[0, :12],
+                       [2.0, 803.0, 210.0, 1.0, 348.0, 1998.0,
+                        12.0, 16.0, 22.0, 26.0, 36.49, 7164713.6])
+    assert np.allclose(values[-1, 24:28], [1.26, 6.8, 56.7, 212.2])
+    assert values[0, 41] == values[0, 42] == MISSING_INDICATOR
+    assert decoder.cunits[1].tobytes().strip() == b'NUMERIC'
+    #  #]
+
+def pack_uncompressed(values, layout):
+    #  #[
+    """
+    encode a 2D array of numerical values as uncompressed section 4
+    (including its 4 byte header) using the given bit layout
+    """
+    bits = 0
+    num_bits = 0
+    for subset_values in values:
+        for (value, width, scale, ref_value) in zip(
+                subset_values, layout['width'], layout['scale'],
+                layout['ref_value']):
+            if value == MISSING_INDICATOR:
+                raw_value = (1 << int(width))-1
+            else:
+                raw_value = int(round(value*10**int(scale)-int(ref_value)))
+            bits = (bits << int(width)) | raw_value
+            num_bits += int(width)
+    padding = (-num_bits) % 8
+    data = (bits << padding).to_bytes((num_bits+padding)//8, 'big')
+    section4 = (len(data)+4).to_bytes(3, 'big') + b'\x00' + data
+    return np.frombuffer(section4, dtype=np.uint8)
+    #  #]
+
+def test_decode_uncompressed_ERS():
+    #  #[
+    """
+    decode the ERS message, store it as uncompressed data,
+    and check that decoding that gives the same values
+    """
+    (msg_bytes, start4, descriptors, num_subsets) = \
+            read_first_msg(testinputfile)
+    decoder = NumpyBUFRDecoder(load_alt_tables())
+    decoder.decode(msg_bytes, start4, descriptors, num_subsets)
+    expected_values = decoder.values.reshape(num_subsets, -1).copy()
+
+    layout = decoder.get_layout(list(descriptors))
+    assert layout['subset_bits'] == 566
+    section4 = pack_uncompressed(expected_values, layout)
+    decoder.decode(section4, 0, descriptors, num_subsets, compressed=False)
+    assert decoder.num_elements == 44
+    assert np.allclose(decoder.values.reshape(num_subsets, -1),
+                       expected_values, rtol=1.e-10)
+    #  #]
+
+def test_uncompressed_delayed_replication_not_supported():
+    #  #[
+    """
+    uncompressed data with delayed replication must be passed
+    on to the bufrex decoder
+    """
+    (msg_bytes, start4, descriptors, num_subsets) = \
+            read_first_msg(os.path.join(TESTDATADIR, 'synop2.bin'))
+    decoder = NumpyBUFRDecoder(load_alt_tables())
+    with pytest.raises(NotYetImplementedError):
+        decoder.decode(msg_bytes, start4, descriptors, num_subsets,
+                       compressed=False)
+    #  #]
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+
+import os         # operating system functions
+import io         # in-memory streams
+import numpy as np # import numerical capabilities
+import pytest
+from pybufr_ecmwf.raw_bufr_file import RawBUFRFile, RawBUFRStream
+from pybufr_ecmwf.custom_exceptions import IncorrectUsageError
+from .shared_setup import TESTDATADIR
+
+"""
+tests to check the RawBUFRFile class
+(these only use pure python code, so do not need the setup fixture)
+"""
+# common settings for the following tests
+testinputfile = os.path.join(TESTDATADIR, 'Testfile.BUFR')
+corruptedtestinputfile = os.path.join(TESTDATADIR,
+                                      'Testfile3CorruptedMsgs.BUFR')
+
+def test_mmap_mode_matches_default_mode():
+    #  #[
+    """
+    check that the lazily scanned memory mapped mode
+    returns the same messages as the default mode
+    """
+    rbf = RawBUFRFile()
+    rbf.open(corruptedtestinputfile, 'rb')
+    rbf_mm = RawBUFRFile(use_mmap=True)
+    rbf_mm.open(corruptedtestinputfile, 'rb')
+
+    # nothing should be scanned yet
+    assert rbf_mm.nr_of_bufr_messages == 0
+
+    # the first message should only scan the first message
+    (words, section_sizes, section_start_locations) = \
+            rbf_mm.get_next_raw_bufr_msg()
+    assert rbf_mm.nr_of_bufr_messages == 1
+    assert section_sizes == rbf.list_of_bufr_pointers[0][2]
+    assert section_start_locations == rbf.list_of_bufr_pointers[0][3]
+    assert (words == rbf.get_raw_bufr_msg(1)[0]).all()
+
+    assert rbf_mm.get_num_bufr_msgs() == rbf.get_num_bufr_msgs() == 3
+    for msg_nr in range(1, 4):
+        assert (rbf_mm.get_raw_bufr_msg(msg_nr)[0] ==
+                rbf.get_raw_bufr_msg(msg_nr)[0]).all()
+
+    rbf_mm.close()
+    rbf.close()
+    #  #]
+
+def test_split_skips_junk_and_false_start_markers(tmp_path):
+    #  #[
+    """
+    check that split() finds the messages in between GTS like headers,
+    false BUFR start markers and a truncated message at the end
+    """
+    with open(testinputfile, 'rb') as fd:
+        msg = fd.read()
+
+    junk = b'ZCZC 123\r\r\nISXH58 EUSR 162225\r\r\n'
+    data = (junk + b'BUFR\x00\x00' + msg + junk + msg +
+            b'\x00\x00' + msg[:100])
+    testfile = str(tmp_path / 'junk.BUFR')
+    with open(testfile, 'wb') as fd:
+        fd.write(data)
+
+    rbf = RawBUFRFile()
+    rbf.open(testfile, 'rb')
+    assert rbf.get_num_bufr_msgs() == 2
+    # this test file is padded with 2 zero bytes after the 7777 string
+    msg_size = len(msg) - 2
+    start1 = len(junk) + 6
+    start2 = start1 + len(msg) + len(junk)
+    assert [p[:2] for p in rbf.list_of_bufr_pointers] == \
+           [(start1, start1 + msg_size), (start2, start2 + msg_size)]
+    rbf.close()
+    #  #]
+
+def test_index_file_is_reused(tmp_path):
+    #  #[
+    """
+    check that a sidecar index file is written, reused on the next
+    open, and ignored once the BUFR file has been modified
+    """
+    index_dir = str(tmp_path / 'index_cache')
+    rbf = RawBUFRFile(use_index_file=True, index_dir=index_dir)
+    rbf.open(corruptedtestinputfile, 'rb')
+    index = rbf.get_index()
+    index_filename = rbf.get_index_filename()
+    rbf.close()
+    assert os.path.exists(index_filename)
+    assert list(index['num_subsets']) == [361, 361, 361]
+
+    # reopening should not need to scan the file
+    rbf = RawBUFRFile(use_index_file=True, index_dir=index_dir)
+    rbf.split = None
+    rbf.open(corruptedtestinputfile, 'rb')
+    assert rbf.get_num_bufr_msgs() == 3
+    assert (rbf.get_index() == index).all()
+    # and the messages are read on demand in stead of the whole file
+    assert rbf.data is None
+    words = [rbf.get_raw_bufr_msg(i)[0] for i in range(1, 4)]
+    rbf.close()
+    rbf = RawBUFRFile()
+    rbf.open(corruptedtestinputfile, 'rb')
+    for (i, msg_words) in enumerate(words):
+        assert (msg_words == rbf.get_raw_bufr_msg(i+1)[0]).all()
+    rbf.close()
+
+    # a modified file should invalidate the index
+    testfile = str(tmp_path / 'copy.BUFR')
+    with open(corruptedtestinputfile, 'rb') as fd:
+        data = fd.read()
+    with open(testfile, 'wb') as fd:
+        fd.write(data)
+    rbf = RawBUFRFile(use_index_file=True)
+    rbf.open(testfile, 'rb')
+    rbf.close()
+    with open(testfile, 'ab') as fd:
+        fd.write(data[:6600])
+    rbf = RawBUFRFile(use_index_file=True)
+    rbf.open(testfile, 'rb')
+    assert rbf.get_num_bufr_msgs() == 4
+    rbf.close()
+    #  #]
+
+def test_raw_msg_words(tmp_path):
+    #  #[
+    """
+    check the word arrays returned for messages inside the file
+    and for a message at the end of the file that needs padding
+    """
+    with open(testinputfile, 'rb') as fd:
+        msg = fd.read()
+    # strip the 2 padding bytes present in this test file
+    msg = msg[:-2]
+    testfile = str(tmp_path / 'unpadded.BUFR')
+    with open(testfile, 'wb') as fd:
+        fd.write(msg + msg)
+
+    rbf = RawBUFRFile()
+    rbf.open(testfile, 'rb')
+    words1 = rbf.get_raw_bufr_msg(1)[0]
+    words2 = rbf.get_raw_bufr_msg(2)[0]
+    assert words1.dtype == np.dtype('<i4')
+    assert len(words1) == len(words2) == 1650
+    # the first message takes the first 2 bytes of the second one
+    # as padding, the last one is padded with zeros
+    assert words1[:-1].tobytes() == words2[:-1].tobytes() == msg[:6596]
+    assert words1[-1:].tobytes() == msg[6596:] + msg[:2]
+    assert words2[-1:].tobytes() == msg[6596:] + b'\x00\x00'
+    rbf.close()
+    #  #]
+
+def test_write_raw_msgs(tmp_path):
+    #  #[
+    """
+    check writing messages, with and without trimming the padding bytes
+    """
+    rbf = RawBUFRFile()
+    rbf.open(corruptedtestinputfile, 'rb')
+    words = rbf.get_raw_bufr_msg(1)[0]
+    rbf.close()
+
+    for trim_padding, expected_size in [(False, 3*6600), (True, 3*6598)]:
+        testfile = str(tmp_path / 'out_{}.BUFR'.format(trim_padding))
+        rbf = RawBUFRFile(trim_padding=trim_padding, flush_every=2)
+        rbf.open(testfile, 'wb')
+        # also allow writing a list of (64-bit) python integers
+        for msg in [words, words.astype(np.int64), words.tolist()]:
+            rbf.write_raw_bufr_msg(msg)
+        assert rbf.nr_of_bufr_messages == 3
+        assert rbf.filesize == expected_size
+        rbf.close()
+
+        assert os.path.getsize(testfile) == expected_size
+        rbf = RawBUFRFile()
+        rbf.open(testfile, 'rb')
+        assert rbf.get_num_bufr_msgs() == 3
+        assert (rbf.get_raw_bufr_msg(3)[0] == words).all()
+        rbf.close()
+    #  #]
+
+def test_append_without_reparsing(tmp_path):
+    #  #[
+    """
+    check the (lazy) message count when appending to an existing file,
+    and the update of the sidecar index file after appending
+    """
+    rbf = RawBUFRFile()
+    rbf.open(corruptedtestinputfile, 'rb')
+    words = rbf.get_raw_bufr_msg(1)[0]
+    rbf.close()
+
+    testfile = str(tmp_path / 'append.BUFR')
+    rbf = RawBUFRFile()
+    rbf.open(testfile, 'wb')
+    rbf.write_raw_bufr_msg(words)
+    rbf.write_raw_bufr_msg(words)
+    rbf.close()
+
+    # without index file the existing messages are only counted on request
+    rbf = RawBUFRFile()
+    rbf.open(testfile, 'ab')
+    assert rbf.count_pending
+    rbf.write_raw_bufr_msg(words)
+    assert rbf.get_num_bufr_msgs() == 3
+    rbf.close()
+
+    # create an index file, and check it is used and updated when appending
+    rbf = RawBUFRFile(use_index_file=True)
+    rbf.open(testfile, 'rb')
+    rbf.close()
+    rbf = RawBUFRFile(use_index_file=True)
+    rbf.open(testfile, 'ab')
+    assert not rbf.count_pending
+    assert rbf.get_num_bufr_msgs() == 3
+    rbf.write_raw_bufr_msg(words)
+    rbf.close()
+
+    rbf = RawBUFRFile(use_index_file=True)
+    rbf.split = None
+    rbf.open(testfile, 'rb')
+    assert rbf.get_num_bufr_msgs() == 4
+    assert list(rbf.get_index()['start']) == [0, 6600, 13200, 19800]
+    rbf.close()
+    #  #]
+
+def test_stream_reading():
+    #  #[
+    """
+    check reading messages from a stream in small chunks, including
+    junk in between the messages and a truncated message at the end
+    """
+    rbf = RawBUFRFile()
+    rbf.open(corruptedtestinputfile, 'rb')
+    expected_msgs = [rbf.get_raw_bufr_msg(i)[0] for i in range(1, 4)]
+    rbf.close()
+
+    with open(corruptedtestinputfile, 'rb') as fd:
+        data = fd.read()
+    junk = b'ZCZC 123\r\r\nISXH58 EUSR 162225\r\r\nBUFR'
+    stream = io.BytesIO(junk + data + junk + data[:1000])
+
+    rbfs = RawBUFRStream(stream, chunk_size=1000)
+    msgs = list(rbfs.raw_messages())
+    assert len(msgs) == 3
+    for (words, section_sizes, section_start_locations), expected in \
+            zip(msgs, expected_msgs):
+        assert section_sizes == [4, 18, 0, 10, 6562, 4]
+        # the stream reader pads with zeros in stead of the
+        # bytes following the message in the file
+        assert (words[:-1] == expected[:-1]).all()
+    # only the data that could hold the start of a message is kept
+    assert len(rbfs.data) <= 3
+
+    # random access is not possible on a stream
+    for method, args in [(rbfs.headers, ()),
+                         (rbfs.get_num_bufr_msgs, ()),
+                         (rbfs.get_raw_bufr_msg, (1,))]:
+        with pytest.raises(IncorrectUsageError):
+            method(*args)
+    rbfs.close()
+    #  #]
+
+def test_headers():
+    #  #[
+    """
+    check the header information extracted from sections 0, 1 and 3
+    of all messages in a file, in default and mmap mode
+    """
+    synop_file = os.path.join(TESTDATADIR, 'synop2.bin')
+    for use_mmap in (False, True):
+        rbf = RawBUFRFile(use_mmap=use_mmap)
+        rbf.open(testinputfile, 'rb')
+        hdr = rbf.headers()
+        rbf.close()
+        assert len(hdr) == 1
+        assert hdr['edition'][0] == 0
+        assert hdr['centre'][0] == 210
+        assert hdr['data_category'][0] == 12
+        assert hdr['data_subcategory'][0] == 8
+        assert hdr['local_table_version'][0] == 1
+        assert hdr['datetime'][0] == np.datetime64('1998-12-16T22:25:00')
+        assert hdr['num_subsets'][0] == 361
+        assert hdr['compressed'][0]
+
+        rbf = RawBUFRFile(use_mmap=use_mmap)
+        rbf.open(synop_file, 'rb')
+        hdr = rbf.headers()
+        index = rbf.get_index()
+        rbf.close()
+        assert len(hdr) == 40
+        assert (hdr['offset'] == index['start']).all()
+        assert (hdr['length'] == index['end']-index['start']).all()
+        assert (hdr['num_subsets'] == index['num_subsets']).all()
+        assert (hdr['edition'] == 4).all()
+        assert (hdr['data_category'] == 0).all()
+        assert hdr['centre'][0] == 88
+        assert hdr['datetime'][0] == np.datetime64('2016-12-13T09:00:00')
+        assert not hdr['compressed'].any()
+        # the same 4 templates as found by sort_bufr_msgs.py
+        counts = np.unique(hdr['template_hash'], return_counts=True)[1]
+        assert sorted(counts) == [1, 2, 7, 30]
+    #  #]